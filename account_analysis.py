@@ -1,22 +1,17 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
-from src.data_processing import filter_data_by_account
-from src.calculations import calculate_segments_for_month
+from src.dataset_store import get_dataset_store
+from src.aggregate_cache import aggregate_cache
+from src.calculations import retention_results
+from src.months import month_index_from_str
 from src.plots import plot_ratios
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
 
 def account_analysis_page(df):
     st.title("Account Analysis")
 
-@st.cache_data
-def get_filtered_data(df, account_manager):
-    return filter_data_by_account(df, account_manager)
-
-@st.cache_data
-def get_account_results(df_account, recent_months):
-    return pd.concat([calculate_segments_for_month(df_account, month) for month in recent_months], ignore_index=True)
-
 def generate_summary_boxes(results):
     colors = {
         'Acquisition': '#FFCCCC',
@@ -41,33 +36,30 @@ def generate_summary_boxes(results):
             boxes.append(box)
     return boxes
 
-def account_analysis(df):
+def account_analysis(store):
     st.title('Analyse de la Rétention par Account Manager')
+    df = store.orders
 
-    # Nettoyage de la colonne 'Owner email'
-    df['Owner email'] = df['Owner email'].astype(str).dropna()
+    # Les emails manquants sont regroupés sous "BLOCKED C1" (sans modifier les données partagées)
+    owner_emails = df['Owner email'].astype(object).fillna('BLOCKED C1')
 
     # Disposition en colonnes pour la sélection et la mise à jour
     col1, col2 = st.columns([3, 1])
     with col1:
         account_manager = st.selectbox(
             'Sélectionner un account manager',
-            sorted(df['Owner email'].unique())
+            sorted(owner_emails.unique())
         )
     with col2:
         if st.button('Mettre à jour'):
-            st.cache_data.clear()
-            st.experimental_rerun()
-
-    # Filtrer les données par account manager
-    df_account = get_filtered_data(df, account_manager)
+            # Recalculer uniquement les agrégats de cet account manager (le cache des autres est conservé)
+            aggregate_cache.invalidate(manager=account_manager)
+            st.rerun()
 
-    # Calculer les segments pour chaque mois depuis trois mois avant le mois en cours pour l'account manager
+    # Segments de tous les mois pour l'account manager (mois clos lus dans l'historique de rétention)
     today = datetime.today()
     current_month = today.replace(day=1)
-    start_month = (current_month - pd.DateOffset(months=3)).strftime('%Y-%m')
-    recent_months = pd.date_range(start=start_month, end=current_month, freq='MS').strftime('%Y-%m').tolist()
-    account_results = get_account_results(df_account, recent_months)
+    account_results = retention_results(store.version, manager=account_manager)
 
     current_month_str = current_month.strftime('%Y-%m')
     current_month_results_account = account_results[account_results['Mois'] == current_month_str]
@@ -92,21 +84,21 @@ def account_analysis(df):
         st.plotly_chart(fig, use_container_width=True)
 
     # Préparer le tableau
-    df['Derniere commande'] = df.groupby('Restaurant ID')['Date de commande'].transform('max')
-    df_latest = df[df['Owner email'] == account_manager].drop_duplicates('Restaurant ID')
-
-    def client_type(row):
-        first_order_month = row['date 1ere commande (Restaurant)'].strftime('%Y-%m')
-        if first_order_month == current_month_str:
-            return 'Acquisition'
-        elif first_order_month == (current_month - pd.DateOffset(months=1)).strftime('%Y-%m'):
-            return 'Nouveaux Clients'
-        elif first_order_month in [(current_month - pd.DateOffset(months=i)).strftime('%Y-%m') for i in range(2, 6)]:
-            return 'Clients Récents'
-        else:
-            return 'Anciens Clients'
-
-    df_latest['Type de Client'] = df_latest.apply(client_type, axis=1)
+    df_latest = df[owner_emails == account_manager].drop_duplicates('Restaurant ID')
+    df_latest['Owner email'] = account_manager
+    df_latest['Derniere commande'] = df_latest['Restaurant ID'].map(store.last_order_dates)
+
+    current_month_index = month_index_from_str(current_month_str)
+    first_month = df_latest['Mois 1ere commande Index']
+    df_latest['Type de Client'] = np.select(
+        [
+            first_month == current_month_index,
+            first_month == current_month_index - 1,
+            first_month.between(current_month_index - 5, current_month_index - 2)
+        ],
+        ['Acquisition', 'Nouveaux Clients', 'Clients Récents'],
+        default='Anciens Clients'
+    )
 
     # Mise en forme des données pour le tableau
     df_display = df_latest[['Owner email', 'Restaurant ID', 'Restaurant', 'Type de Client', 'Derniere commande']]
@@ -147,8 +139,20 @@ def account_analysis(df):
         mime='text/csv',
     )
 
+    # Préparer les recommandations de tout le portefeuille (lues ensuite par la page Client Info)
+    if st.button('Préparer les recommandations du portefeuille'):
+        # Import au premier clic : le moteur de recommandations (scikit-learn, scipy) n'est pas chargé sinon
+        from batch_recommendations import run_batch
+        with st.spinner('Calcul des recommandations...'):
+            # Dans le processus de l'application (pas de fork d'un serveur multi-thread)
+            batch, summary = run_batch(manager=account_manager, workers=1)
+        st.success(
+            f"{summary['clients']} clients préparés en {summary['total_s']:.1f} s "
+            f"(médiane {summary['median_ms']:.0f} ms par client, {summary['errors']} erreurs)"
+        )
+        st.dataframe(batch[['Restaurant_id', 'duration_ms', 'error']].sort_values('duration_ms', ascending=False))
+
 # Appel de la fonction pour créer la page des objectifs
 if __name__ == "__main__":
     # Charger les données
-    historical_data, df = load_data()
-    account_analysis(df)
+    account_analysis(get_dataset_store())
@@ -3,16 +3,21 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-
-@st.cache_data
-def calculate_active_users(df, target_month):
-    previous_month = (pd.to_datetime(target_month) - pd.DateOffset(months=1)).strftime('%Y-%m')
-    target_orders = df[df['Date de commande'].dt.strftime('%Y-%m') == target_month]
-    nouveaux_clients = target_orders[target_orders['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') == previous_month]
-    clients_recents = target_orders[target_orders['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m').isin(
-        [(pd.to_datetime(target_month) - pd.DateOffset(months=i)).strftime('%Y-%m') for i in range(2, 6)]
-    )]
-    anciens_clients = target_orders[target_orders['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') < (pd.to_datetime(target_month) - pd.DateOffset(months=5)).strftime('%Y-%m')]
+from src.months import month_index_from_str
+from src.dataset_store import get_dataset_store
+from src.aggregate_cache import cached_aggregate
+from src.retention_history import COUNTRIES
+
+# Indexé par la version des données, le mois et le pays (les commandes viennent du store)
+@cached_aggregate()
+def calculate_active_users(version, target_month, country=None):
+    df = get_dataset_store(version).scope('orders', country=country)
+    month = month_index_from_str(target_month)
+    target_orders = df[df['Mois Index'] == month]
+    first_month = target_orders['Mois 1ere commande Index']
+    nouveaux_clients = target_orders[first_month == month - 1]
+    clients_recents = target_orders[first_month.between(month - 5, month - 2)]
+    anciens_clients = target_orders[first_month < month - 5]
     
     return {
         'Nouveaux Clients': len(nouveaux_clients['Restaurant ID'].unique()),
@@ -32,7 +37,7 @@ def add_total_labels(fig, df, x_col, y_cols):
             yshift=10
         )
 
-def active_users_page(historical_data, df):
+def active_users_page(store):
     st.title("Active Users")
 
     # Calcul des dates dynamiques
@@ -45,7 +50,7 @@ def active_users_page(historical_data, df):
     active_users_data = []
 
     for month in recent_months:
-        monthly_data = calculate_active_users(df, month)
+        monthly_data = calculate_active_users(store.version, month)
         monthly_data['Mois'] = month
         active_users_data.append(monthly_data)
 
@@ -72,14 +77,13 @@ def active_users_page(historical_data, df):
     st.plotly_chart(fig)
 
     # Dropdown pour sélectionner un pays
-    country = st.selectbox('Sélectionner un pays', list(historical_data.keys()))
+    country = st.selectbox('Sélectionner un pays', COUNTRIES)
 
     if country:
-        country_df = df[df['Pays'] == country]
         country_active_users_data = []
 
         for month in recent_months:
-            monthly_data = calculate_active_users(country_df, month)
+            monthly_data = calculate_active_users(store.version, month, country=country)
             monthly_data['Mois'] = month
             country_active_users_data.append(monthly_data)
 
@@ -1,55 +1,94 @@
+import importlib
+import os
 import streamlit as st
 from streamlit_option_menu import option_menu
-from global_analysis import global_analysis
-from account_analysis import account_analysis
-from objectifs import objectifs_page
-from active_users import active_users_page
-from segmentation import segmentation_page
-from client_info import client_info_page  # Ajouter cette ligne
-from src.data_processing import load_data, download_prepared_data, reassign_account_manager, load_recent_purchases, load_segmentation_data
-import gdown
-import pandas as pd
+from src import metrics, profiler
+from src.dataset_store import get_dataset_store, get_snapshots
 
+# Pages du menu (module, fonction) : le module d'une page et ses dépendances (plotly, st_aggrid,
+# scikit-learn...) ne sont importés qu'à la première sélection de la page dans le processus
+PAGES = {
+    "Analyse Globale": ("global_analysis", "global_analysis"),
+    "Par Account": ("account_analysis", "account_analysis"),
+    "Objectifs": ("objectifs", "objectifs_page"),
+    "Active Users": ("active_users", "active_users_page"),
+    "Segmentation": ("segmentation", "segmentation_page"),
+    "Client Info": ("client_info", "client_info_page"),
+}
+ICONS = ["bar-chart", "person-circle", "target", "graph-up", "grid", "info-circle"]
 
-# Télécharger et charger les données
-download_prepared_data()
-historical_data, df = load_data()
-segmentation_df = load_segmentation_data()
+# Page d'administration des captures de profilage, visible avec ?admin=1 ou quand PROFILE_PAGES est défini
+ADMIN_PAGES = {
+    "Profils": ("profiles", "profiles_page"),
+}
+ADMIN_ICONS = ["speedometer"]
 
+def load_page(name):
+    module_name, function_name = PAGES[name] if name in PAGES else ADMIN_PAGES[name]
+    return getattr(importlib.import_module(module_name), function_name)
 
 
-# Charger les achats récents
-@st.cache_data
-def load_recent_purchases():
-    url = 'https://docs.google.com/spreadsheets/d/1sv6E1UsMV3fe-T_3p94uAUt1kz4xlXZA/export?format=xlsx'
-    df = pd.read_excel(gdown.download(url, None, quiet=False), parse_dates=['Date'])
-    return df
+# Export des mesures pour Prometheus sur METRICS_PORT (un seul serveur par processus)
+@st.cache_resource
+def start_metrics_server():
+    port = os.environ.get('METRICS_PORT')
+    return metrics.serve_prometheus(int(port)) if port else None
 
-df_recent_purchases = load_recent_purchases()
+
+# Instantané du store partagé par toutes les sessions : chaque jeu de données est chargé au premier
+# accès par une page, et toute l'exécution lit le même instantané même si un rafraîchissement est publié
+store = get_dataset_store()
 
 # Menu vertical
+admin = st.query_params.get('admin') == '1' or bool(profiler.PROFILE_PAGES)
 with st.sidebar:
     selected = option_menu(
         "Menu",
-        ["Analyse Globale", "Par Account", "Objectifs", "Active Users", "Segmentation", "Client Info"],  # Ajouter "Client Info"
-        icons=["bar-chart", "person-circle", "target", "graph-up", "grid", "info-circle"],  # Ajouter une icône
+        list(PAGES) + (list(ADMIN_PAGES) if admin else []),
+        icons=ICONS + (ADMIN_ICONS if admin else []),  # Ajouter une icône
         menu_icon="cast",
         default_index=0,
     )
 
 default_client_id = 44290
-# Afficher la page sélectionnée
-if selected == "Analyse Globale":
-    global_analysis(historical_data, df)
-elif selected == "Par Account":
-    account_analysis(df)
-elif selected == "Objectifs":
-    objectifs_page(df)
-elif selected == "Active Users":
-    active_users_page(historical_data, df)
-elif selected == "Segmentation":
-    segmentation_page(df)
-elif selected == "Client Info":  # Ajouter cette section
-    client_info_page(df, df_recent_purchases, segmentation_df, default_client_id)  # Appeler la fonction avec un ID de client en dur
+# Afficher la page sélectionnée (mesurée avec les fonctions qu'elle appelle quand l'instrumentation est active :
+# la durée propre de la page correspond au rendu Streamlit et à la sérialisation des graphiques)
+start_metrics_server()
+page = load_page(selected)
+
+# Profilage à la demande de ce rendu (?profile=1|sample ou PROFILE_PAGES), limité au thread de cette session.
+# La capture est étiquetée par la page, les paramètres de l'URL et des widgets, et la version des données.
+profile_mode = profiler.requested_mode(selected, st.query_params)
+profile_params = {key: value for key, value in st.query_params.items() if key != 'profile'}
+profile_result = {}
+with metrics.span(f'page.{selected}'), profiler.capture(selected, profile_params, store.version, profile_mode, profile_result):
+    if selected == "Client Info":
+        page(store, default_client_id)  # Appeler la fonction avec un ID de client en dur
+    else:
+        page(store)
+    profile_params.update({key: value for key, value in st.session_state.items() if isinstance(value, (str, int, float, bool))})
+
+if profile_result:
+    # Une seule capture par demande : le paramètre est retiré pour les rendus suivants
+    if 'profile' in st.query_params:
+        del st.query_params['profile']
+    st.sidebar.success(f"Rendu profilé ({profile_result['duration_s']:.2f} s) : {profile_result['name']}")
+
+# Temps de chargement des jeux de données (démarrage à froid du processus)
+with st.sidebar.expander('Temps de chargement'):
+    st.dataframe(store.load_report())
+    # Mémoire économisée par la compaction des colonnes (à la conversion des sources)
+    st.dataframe(store.compaction_report())
 
+# Mesures cumulées depuis le démarrage du processus (instrumentation active)
+if metrics.sample_rate > 0:
+    with st.sidebar.expander('Mesures'):
+        st.dataframe(metrics.summary().round(1))
 
+# Rafraîchissement des commandes en arrière-plan (si configuré, voir src.refresher)
+refresher = get_snapshots().refresher
+if refresher is not None:
+    with st.sidebar.expander('Rafraîchissement des données'):
+        st.write({name: str(value) for name, value in refresher.status().items() if value is not None})
+        if st.button('Vérifier maintenant'):
+            refresher.request()
@@ -0,0 +1,147 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from src.dataset_store import get_dataset_store
+from src.data_processing import filter_data_by_account
+from recommendations import get_client_recommendations
+
+# Répertoire des recommandations préparées (un fichier Parquet par lot)
+RECOMMENDATIONS_DIR = os.path.join('data', 'recommendations')
+
+# Nombre de clients envoyés à la fois à chaque processus
+CHUNK_SIZE = 16
+
+
+# Conversion des valeurs pandas/numpy (dates, entiers numpy, NaN) pour la sérialisation JSON
+def to_json_value(value):
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+# Restaurants d'un portefeuille : un account manager et/ou un pays
+def portfolio_clients(store, manager=None, country=None):
+    restaurants = store.restaurants.table
+    if manager is not None:
+        restaurants = filter_data_by_account(restaurants, manager)
+    if country is not None:
+        restaurants = restaurants[restaurants['Pays'] == country]
+    return restaurants.index.tolist()
+
+
+# Jeux de données utilisés par get_client_recommendations
+RECOMMENDATION_DATASETS = ['restaurants', 'purchases', 'recent_purchases', 'segmentation', 'similarity', 'peer_support', 'replenishment']
+
+
+# Charger dans le processus courant tous les jeux de données des recommandations. Une fois chargé, un
+# jeu de données est lu dans l'attribut de l'instance, sans prendre de verrou.
+def preload(store):
+    for name in RECOMMENDATION_DATASETS:
+        getattr(store, name)
+
+
+# Recommandations d'un client (dans le processus courant ou dans un processus du pool, qui hérite par fork du store préchargé)
+def recommend_client(client_id):
+    start = time.perf_counter()
+    try:
+        recommendations = json.dumps(get_client_recommendations(get_dataset_store(), client_id), default=to_json_value, ensure_ascii=False)
+        error = None
+    except Exception as e:
+        recommendations = None
+        error = f'{type(e).__name__}: {e}'
+    return {
+        'Restaurant_id': client_id,
+        'recommendations': recommendations,
+        'error': error,
+        'duration_ms': (time.perf_counter() - start) * 1000,
+    }
+
+
+def batch_name(manager=None, country=None):
+    scope = '_'.join(part for part in [country, manager] if part) or 'tous'
+    return re.sub(r'[^A-Za-z0-9_.-]+', '-', scope)
+
+
+# Calculer les recommandations de tout un portefeuille et les écrire sur disque.
+# workers=1 calcule dans le processus courant : c'est le cas depuis l'application, dont les threads
+# (sessions, rafraîchissement, mesures...) rendent un fork dangereux. Le pool de processus (fork)
+# est réservé à la ligne de commande.
+def run_batch(manager=None, country=None, workers=None):
+    store = get_dataset_store()
+    client_ids = portfolio_clients(store, manager=manager, country=country)
+
+    start = time.perf_counter()
+    preload(store)
+    if workers == 1 or len(client_ids) <= CHUNK_SIZE:
+        results = [recommend_client(client_id) for client_id in client_ids]
+    else:
+        # Avec fork, les processus héritent du store préchargé au lieu de le recharger
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = list(pool.map(recommend_client, client_ids, chunksize=CHUNK_SIZE))
+
+    batch = pd.DataFrame(results, columns=['Restaurant_id', 'recommendations', 'error', 'duration_ms'])
+    batch['version'] = store.version
+    batch['generated_at'] = pd.Timestamp.now()
+    batch['duration_ms'] = batch['duration_ms'].astype('float32')
+
+    os.makedirs(RECOMMENDATIONS_DIR, exist_ok=True)
+    path = os.path.join(RECOMMENDATIONS_DIR, f'{batch_name(manager, country)}.parquet')
+    tmp_path = path + '.tmp'
+    batch.to_parquet(tmp_path, index=False, compression='zstd')
+    os.replace(tmp_path, path)
+
+    summary = {
+        'clients': len(batch),
+        'errors': int(batch['error'].notna().sum()),
+        'total_s': time.perf_counter() - start,
+        'median_ms': float(batch['duration_ms'].median()) if len(batch) else 0.0,
+        'max_ms': float(batch['duration_ms'].max()) if len(batch) else 0.0,
+        'path': path,
+    }
+    return batch, summary
+
+
+# Recommandations préparées d'un client pour la version des données en cours (None si absentes)
+def load_prepared_recommendations(client_id, version):
+    if not os.path.isdir(RECOMMENDATIONS_DIR):
+        return None
+    found = []
+    for name in os.listdir(RECOMMENDATIONS_DIR):
+        if name.endswith('.parquet'):
+            rows = pd.read_parquet(
+                os.path.join(RECOMMENDATIONS_DIR, name),
+                filters=[('Restaurant_id', '==', client_id), ('version', '==', version)]
+            )
+            found.append(rows[rows['recommendations'].notna()])
+    if not found:
+        return None
+    prepared = pd.concat(found, ignore_index=True)
+    if prepared.empty:
+        return None
+    latest = prepared.sort_values('generated_at').iloc[-1]
+    return json.loads(latest['recommendations']), latest['generated_at']
+
+
+# Préparation des recommandations d'un portefeuille, par exemple chaque matin :
+# python batch_recommendations.py --manager prenom.nom@exemple.com
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Préparer les recommandations d'un portefeuille de clients")
+    parser.add_argument('--manager', help="Email de l'account manager")
+    parser.add_argument('--country', help='Code pays (FR, US, GB, BE)')
+    parser.add_argument('--workers', type=int, default=None, help='Nombre de processus (par défaut : nombre de coeurs)')
+    args = parser.parse_args()
+
+    batch, summary = run_batch(manager=args.manager, country=args.country, workers=args.workers)
+    print(f"{summary['clients']} clients en {summary['total_s']:.1f} s "
+          f"(médiane {summary['median_ms']:.0f} ms, max {summary['max_ms']:.0f} ms, {summary['errors']} erreurs) -> {summary['path']}")
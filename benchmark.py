@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+# Référence des performances (par échelle de données), propre à chaque machine
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'benchmarks', 'baseline.json')
+
+# Une mesure est une régression quand elle dépasse la référence de plus de TOLERANCE (et d'au moins MIN_DELTA_MS)
+TOLERANCE = 0.25
+MIN_DELTA_MS = 1.0
+
+
+def scale_key(args):
+    return f'{args.orders}_{args.restaurants}_{args.products}_{args.purchases}_{args.seed}'
+
+
+# Fonctions de calcul des pages, appelées hors de Streamlit : (nom, fonction sans argument).
+# Chaque appel des fonctions de recommandation porte sur un client différent de l'échantillon.
+def compute_paths(store, n_clients=20):
+    from src.calculations import calculate_segments_for_month, get_clients_by_segment_and_spending, process_country_data, compare_spending
+    from src.months import month_index_from_str
+    from active_users import calculate_active_users
+    from objectifs import get_active_clients
+    from segmentation import spending_changes
+    from recommendations import get_client_recommendations
+
+    today = datetime.today()
+    current_month = today.strftime('%Y-%m')
+    previous_month = (today.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+    version = store.version
+    manager = store.orders['Owner email'].value_counts().index[0]
+
+    # Entrées de la comparaison de la page Segmentation (calculées une fois, hors mesure)
+    previous_spending = get_clients_by_segment_and_spending(version, previous_month, manager=manager)[2]
+    current_spending = get_clients_by_segment_and_spending(version, current_month, manager=manager)[2]
+
+    def segmentation_diff():
+        clients = compare_spending(store.restaurants, previous_spending, current_spending, month_index_from_str(previous_month), month_index_from_str(current_month))
+        return spending_changes(clients)
+
+    clients = store.purchases.purchases['Restaurant_id'].drop_duplicates().to_numpy()
+    clients = clients[np.linspace(0, len(clients) - 1, min(n_clients, len(clients))).astype(int)]
+    calls = {'count': 0}
+
+    def recommendations():
+        client_id = clients[calls['count'] % len(clients)]
+        calls['count'] += 1
+        return get_client_recommendations(store, client_id)
+
+    return [
+        ('calculate_segments_for_month', lambda: calculate_segments_for_month(version, current_month)),
+        ('calculate_segments_for_month (FR, Paris)', lambda: calculate_segments_for_month(version, current_month, country='FR', region='Paris')),
+        ('get_clients_by_segment_and_spending', lambda: get_clients_by_segment_and_spending(version, current_month)),
+        ('calculate_active_users', lambda: calculate_active_users(version, current_month)),
+        ('get_active_clients', lambda: get_active_clients(version, current_month)),
+        ('process_country_data (FR)', lambda: process_country_data(version, 'FR')),
+        ('segmentation (comparaison des mois)', segmentation_diff),
+        ('get_recommendations', recommendations),
+    ]
+
+
+# Latence (cache des agrégats vidé avant chaque appel) et pic de mémoire Python d'une fonction
+def measure(function, repeat):
+    from src.aggregate_cache import aggregate_cache
+
+    durations = []
+    for _ in range(repeat):
+        aggregate_cache.clear()
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    aggregate_cache.clear()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'Médiane (ms)': float(np.median(durations)), 'Max (ms)': float(np.max(durations)), 'Pic mémoire (Mo)': peak / 1e6}
+
+
+# Comparer les mesures à la référence de la même échelle de données
+def flag_regressions(results, baseline, tolerance=TOLERANCE):
+    results['Référence (ms)'] = [baseline.get(name, {}).get('Médiane (ms)', np.nan) for name in results['Fonction']]
+    results['Référence mémoire (Mo)'] = [baseline.get(name, {}).get('Pic mémoire (Mo)', np.nan) for name in results['Fonction']]
+    slower = (results['Médiane (ms)'] > results['Référence (ms)'] * (1 + tolerance)) & (results['Médiane (ms)'] - results['Référence (ms)'] > MIN_DELTA_MS)
+    larger = results['Pic mémoire (Mo)'] > results['Référence mémoire (Mo)'] * (1 + tolerance)
+    results['Régression'] = np.where(slower & larger, 'temps, mémoire', np.where(slower, 'temps', np.where(larger, 'mémoire', '')))
+    return results
+
+
+def read_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, 'r') as f:
+        return json.load(f)
+
+
+def save_baseline(key, results):
+    baselines = read_baseline()
+    baselines[key] = {
+        row['Fonction']: {'Médiane (ms)': row['Médiane (ms)'], 'Pic mémoire (Mo)': row['Pic mémoire (Mo)']}
+        for _, row in results.iterrows()
+    }
+    os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+    tmp_path = BASELINE_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(baselines, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, BASELINE_PATH)
+
+
+# Banc d'essai des calculs des pages sur un jeu de données synthétique (généré une fois par échelle) :
+# python benchmark.py --orders 1000000 --restaurants 20000 [--save-baseline]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Mesurer les fonctions de calcul des pages sur des données synthétiques')
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--restaurants', type=int, default=5_000)
+    parser.add_argument('--products', type=int, default=1_000)
+    parser.add_argument('--purchases', type=int, default=50_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help='Nombre de mesures par fonction')
+    parser.add_argument('--directory', help='Répertoire du jeu de données (par défaut : répertoire temporaire par échelle)')
+    parser.add_argument('--save-baseline', action='store_true', help='Enregistrer les mesures comme référence de cette échelle')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    # Les sources sont lues relativement au répertoire courant (data/...) : le banc d'essai s'exécute
+    # dans le répertoire du jeu de données synthétique
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from src.synthetic_data import write_dataset
+    directory = args.directory or os.path.join(tempfile.gettempdir(), 'benchmark', scale_key(args))
+    if not os.path.exists(os.path.join(directory, 'data', 'prepared_data.csv')):
+        start = time.perf_counter()
+        write_dataset(directory, args.orders, args.restaurants, args.products, args.purchases, seed=args.seed)
+        print(f"Jeu de données généré dans {directory} en {time.perf_counter() - start:.1f} s")
+    os.chdir(directory)
+
+    import src.dataset_store as dataset_store
+
+    start = time.perf_counter()
+    store = dataset_store.DatasetStore()
+    # Les fonctions en cache lisent ce store (sans session Streamlit ni rafraîchissement en arrière-plan)
+    snapshots = dataset_store.StoreSnapshots(store)
+    dataset_store.get_snapshots = lambda: snapshots
+    paths = compute_paths(store)
+    for name, function in paths:
+        function()
+    print(store.load_report().to_string(index=False))
+    print(f"Chargement et premier appel : {time.perf_counter() - start:.2f} s\n")
+
+    results = pd.DataFrame([{'Fonction': name, **measure(function, args.repeat)} for name, function in paths])
+    results = flag_regressions(results, read_baseline().get(scale_key(args), {}), args.tolerance)
+    print(results.round(2).to_string(index=False))
+
+    if args.save_baseline:
+        save_baseline(scale_key(args), results)
+        print(f"\nRéférence enregistrée : {BASELINE_PATH}")
+    elif (results['Régression'] != '').any():
+        print(f"\n{(results['Régression'] != '').sum()} régression(s) par rapport à la référence")
+        sys.exit(1)
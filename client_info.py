@@ -3,13 +3,8 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
-from src.calculations import get_clients_by_segment_and_spending
 from recommendations import get_recommendations
-from src.segmentation import load_segmentation_data
-
-
-# Charger les données
-segmentation_df = load_segmentation_data()
+from batch_recommendations import load_prepared_recommendations
 
 
 def map_gamme(gamme_value):
@@ -22,11 +17,14 @@ def map_gamme(gamme_value):
     else:
         return "Non défini"
 
-def client_info_page(df, df_recent_purchases, segmentation_df, default_client_id):
+def client_info_page(store, default_client_id):
     st.title("Page d'Information Client")
+    df = store.orders
+    df_recent_purchases = store.recent_purchases
+    segmentation_df = store.segmentation
 
     # Boîte de saisie pour entrer l'ID client
-    client_id_input = st.text_input("Entrez l'ID du client (Restaurant ID)", value=default_client_id)
+    client_id_input = st.text_input("Entrez l'ID du client (Restaurant ID)", value=default_client_id, key='client_id')
     client_id_button = st.button("Valider")
 
     # Mettre à jour le client_id en fonction de l'entrée de l'utilisateur
@@ -35,37 +33,20 @@ def client_info_page(df, df_recent_purchases, segmentation_df, default_client_id
     else:
         client_id = default_client_id
 
-    # Charger les données de segmentation
-    segmentation_df = load_segmentation_data()
-
     # Sélectionner les données du client
     client_data = df[df['Restaurant ID'] == client_id]
 
     # Fusionner les données de segmentation avec les données du client
     client_data = pd.merge(client_data, segmentation_df, left_on='Restaurant ID', right_on='Restaurant_id', how='left')
 
-    # Sélectionner les achats récents du client
-    client_recent_purchases = df_recent_purchases[df_recent_purchases['Restaurant_id'] == client_id]
-
-    # Convertir les dates si elles ne sont pas déjà au format datetime
-    if not pd.api.types.is_datetime64_any_dtype(df['date 1ere commande (Restaurant)']):
-        df['date 1ere commande (Restaurant)'] = pd.to_datetime(df['date 1ere commande (Restaurant)'])
-    if not pd.api.types.is_datetime64_any_dtype(df_recent_purchases['Date']):
-        df_recent_purchases['Date'] = pd.to_datetime(df_recent_purchases['Date'], errors='coerce')
-        df_recent_purchases.dropna(subset=['Date'], inplace=True)
-
-    # Calculer la dernière commande si elle n'existe pas
-    if 'Dernière commande' not in df.columns:
-        df['Dernière commande'] = df.groupby('Restaurant ID')['Date de commande'].transform('max')
-    
-    if 'Dernière commande' not in client_data.columns:
-        client_data.loc[:, 'Dernière commande'] = client_data['Date de commande'].max()
+    # Sélectionner les achats récents du client (tranche contiguë de la table indexée, toutes les statistiques en découlent)
+    client_recent_purchases = store.purchases.client(client_id)
 
     # Informations standard du client
     client_name = client_data["Restaurant"].iloc[0]
     total_spending = round(client_data["Total"].sum())
     first_order_date = client_data["date 1ere commande (Restaurant)"].iloc[0]
-    last_order_date = client_data["Dernière commande"].iloc[0]
+    last_order_date = store.last_order_dates[client_id]
     days_since_last_order = (datetime.now() - last_order_date).days
     days_since_first_order = (datetime.now() - first_order_date).days
 
@@ -92,29 +73,29 @@ def client_info_page(df, df_recent_purchases, segmentation_df, default_client_id
 
     # Calculer les mois dynamiques
     today = datetime.today()
-    current_month_str = today.strftime('%Y-%m')
-    previous_month_str = (today - pd.DateOffset(months=1)).strftime('%Y-%m')
+    current_month_index = today.year * 12 + today.month - 1
+    previous_month_index = current_month_index - 1
 
     if pd.api.types.is_datetime64_any_dtype(client_recent_purchases['Date']):
-        current_month_categories = client_recent_purchases[client_recent_purchases['Date'].dt.strftime('%Y-%m') == current_month_str]["Product Category"].nunique()
+        current_month_categories = store.purchases.client_month(client_id, current_month_index)["Product Category"].nunique()
     else:
         current_month_categories = 0
 
-    suppliers = client_recent_purchases.groupby('Supplier')['Date'].max().reset_index()
+    suppliers = client_recent_purchases.groupby('Supplier', observed=True)['Date'].max().reset_index()
 
-    category_spending = client_recent_purchases.groupby('sub_cat')['GMV'].sum().reset_index()
-    supplier_spending = client_recent_purchases.groupby('Supplier')['GMV'].sum().reset_index()
-    top_products = client_recent_purchases.groupby(['product_name']).size().reset_index(name='counts').sort_values(by='counts', ascending=False)
+    category_spending = client_recent_purchases.groupby('sub_cat', observed=True)['GMV'].sum().reset_index()
+    supplier_spending = client_recent_purchases.groupby('Supplier', observed=True)['GMV'].sum().reset_index()
+    top_products = client_recent_purchases.groupby(['product_name'], observed=True).size().reset_index(name='counts').sort_values(by='counts', ascending=False)
 
     # Algorithme de recommandations basé sur les nouveaux critères
 
-    # Définir les données des mois dynamiques en utilisant df_recent_purchases
-    client_previous_data = df_recent_purchases[(df_recent_purchases['Restaurant_id'] == client_id) & (df_recent_purchases['Date'].dt.strftime('%Y-%m') == previous_month_str)]
-    client_current_data = df_recent_purchases[(df_recent_purchases['Restaurant_id'] == client_id) & (df_recent_purchases['Date'].dt.strftime('%Y-%m') == current_month_str)]
+    # Définir les données des mois dynamiques (bornes des mois dans la tranche du client)
+    client_previous_data = store.purchases.client_month(client_id, previous_month_index)
+    client_current_data = store.purchases.client_month(client_id, current_month_index)
 
     # Calculer les dépenses totales des mois dynamiques à partir de df_recent_purchases
-    previous_spending = df_recent_purchases[(df_recent_purchases['Restaurant_id'] == client_id) & (df_recent_purchases['Date'].dt.strftime('%Y-%m') == previous_month_str)]['GMV'].sum()
-    current_spending = df_recent_purchases[(df_recent_purchases['Restaurant_id'] == client_id) & (df_recent_purchases['Date'].dt.strftime('%Y-%m') == current_month_str)]['GMV'].sum()
+    previous_spending = client_previous_data['GMV'].sum()
+    current_spending = client_current_data['GMV'].sum()
 
     # Afficher les informations standard du client avec cadre et pictogrammes
     st.markdown(
@@ -267,15 +248,23 @@ def client_info_page(df, df_recent_purchases, segmentation_df, default_client_id
 
     st.table(top_products)
 
-    # Afficher les recommandations
-    recommendations = get_recommendations(
-        client_recent_purchases,
-        client_previous_data,
-        client_current_data,
-        df_recent_purchases,
-        segmentation_df,
-        client_id
-    )
+    # Afficher les recommandations (préparées par lot pour le portefeuille si disponibles, sinon calculées ici)
+    prepared = load_prepared_recommendations(client_id, store.version)
+    if prepared is not None:
+        recommendations, generated_at = prepared
+        st.caption(f"Recommandations préparées le {generated_at:%d/%m/%Y à %H:%M}")
+    else:
+        recommendations = get_recommendations(
+            client_recent_purchases,
+            client_previous_data,
+            client_current_data,
+            df_recent_purchases,
+            segmentation_df,
+            client_id,
+            store.similarity,
+            store.peer_support,
+            store.replenishment
+        )
 
     # Mettre en évidence les différents types de recommandations
     def format_recommendations(rec):
@@ -313,10 +302,3 @@ def client_info_page(df, df_recent_purchases, segmentation_df, default_client_id
 
         st.markdown("---")
 
-
-# Charger les données récentes
-def load_recent_purchases():
-    df_recent_purchases = pd.read_excel("dataFR.xlsx", engine='openpyxl')
-    df_recent_purchases['Date'] = pd.to_datetime(df_recent_purchases['Date'], errors='coerce')
-    df_recent_purchases.dropna(subset=['Date'], inplace=True)
-    return df_recent_purchases
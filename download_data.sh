@@ -1,3 +1,3 @@
 #!/bin/bash
-# Download the segmentation data
-gdown "https://docs.google.com/spreadsheets/d/1lCVTDYtM_SWj1W5OqTr15-56K4BCWPqf/edit?usp=sharing&ouid=115682724849456076163&rtpof=true&sd=true" -O segmentation_data.xlsx
+# Télécharger toutes les sources dans data/ (celles déjà présentes ne sont pas retéléchargées)
+python -c "from src.data_processing import fetch_all_sources; fetch_all_sources()"
@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from src.calculations import process_country_data, calculate_segments_for_month, process_region_data
+from src.calculations import process_country_data, process_region_data, retention_results
+from src.retention_history import COUNTRIES
 from src.plots import plot_ratios
+from src.aggregate_cache import aggregate_cache
 
 def global_analysis_page(df):
     st.title("Analyse Globale")
@@ -15,31 +17,33 @@ def get_regions(country_code):
     else:
         return []
 
-def global_analysis(historical_data, df):
+def global_analysis(store):
     st.title('Analyse de la Rétention des Clients')
 
     # Bouton pour mettre à jour les données
-    if st.button('Mettre à jour'):
-        st.cache_data.clear()
-        st.experimental_rerun()
+    refresh = st.button('Mettre à jour')
 
-    countries = list(historical_data.keys()) + ['Global']
+    countries = COUNTRIES + ['Global']
     country_code = st.selectbox('Sélectionner un pays ou une région', countries)
 
+    # Recalculer uniquement les agrégats du pays sélectionné (ou du périmètre global, hors account managers)
+    if refresh:
+        if country_code == 'Global':
+            aggregate_cache.invalidate(country=None, manager=None)
+        else:
+            aggregate_cache.invalidate(country=country_code)
+        st.rerun()
+
     # Calculer les dates dynamiquement
     today = datetime.today()
     current_month = today.replace(day=1)
-    previous_month = (current_month - timedelta(days=1)).replace(day=1)
     current_month_str = current_month.strftime('%Y-%m')
-    previous_month_str = previous_month.strftime('%Y-%m')
 
+    # Mois clos lus dans l'historique de rétention, mois en cours calculé
     if country_code == 'Global':
-        all_historical_data = pd.concat(historical_data.values(), ignore_index=True)
-        recent_months = pd.date_range(start=previous_month - timedelta(days=60), end=current_month, freq='MS').strftime('%Y-%m').tolist()
-        recent_results = pd.concat([calculate_segments_for_month(df, month) for month in recent_months], ignore_index=True)
-        all_results = pd.concat([all_historical_data, recent_results], ignore_index=True)
+        all_results = retention_results(store.version)
     else:
-        all_results = process_country_data(df, historical_data, country_code)
+        all_results = process_country_data(store.version, country_code)
     
     current_month_results = all_results[all_results['Mois'] == current_month_str]
 
@@ -66,7 +70,7 @@ def global_analysis(historical_data, df):
         for region in get_regions(country_code):
             st.subheader(f'Région: {region}')
             try:
-                region_results = process_region_data(df, country_code, region=region)
+                region_results = process_region_data(store.version, country_code, region=region)
                 region_current_month_results = region_results[region_results['Mois'] == current_month_str]
                 region_summary_boxes = generate_region_summary_boxes(region_current_month_results)
                 col1, col2 = st.columns(2)
@@ -2,16 +2,18 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from src.data_processing import load_objectifs, load_data
+from src.dataset_store import get_dataset_store
+from src.aggregate_cache import cached_aggregate
 from src.calculations import calculate_segments_for_month
+from src.objectifs_repository import ObjectifsRepository, from_objectifs_file, to_objectifs_file
+from src import github_storage
 
 # Fonction pour obtenir les clients actuels par segment et par pays
-@st.cache_data
-def get_active_clients(df, target_month):
+@cached_aggregate()
+def get_active_clients(version, target_month):
     result = {}
-    for country in df['Pays'].unique():
-        country_df = df[df['Pays'] == country]
-        active_clients = calculate_segments_for_month(country_df, target_month)
+    for country in get_dataset_store(version).cohort_cube['Pays'].unique():
+        active_clients = calculate_segments_for_month(version, target_month, country=country)
         result[country] = {
             'Nouveaux Clients': active_clients[active_clients['Segment'] == 'Nouveaux Clients']['Nombre de Clients'].values[0],
             'Clients Récents': active_clients[active_clients['Segment'] == 'Clients Récents']['Nombre de Clients'].values[0],
@@ -19,20 +21,43 @@ def get_active_clients(df, target_month):
         }
     return result
 
+# Dépôt des objectifs partagé par toutes les sessions (pool de connexions SQLite)
+@st.cache_resource
+def get_objectifs_repository():
+    return ObjectifsRepository()
+
+# Objectifs d'un mois : ceux du dépôt, initialisés depuis le fichier objectifs.xlsx pour un nouveau mois.
+# L'initialisation n'a lieu qu'une fois par mois : une modification ultérieure du fichier xlsx n'est plus
+# reprise pour ce mois (les objectifs se modifient dans la page, avec historique).
+def get_month_objectifs(repository, store, month):
+    objectifs = repository.get(month)
+    if objectifs.empty:
+        repository.upsert(from_objectifs_file(store.objectifs, month), author='objectifs.xlsx')
+        objectifs = repository.get(month)
+    return objectifs
+
+# Copie des objectifs courants dans le dépôt GitHub ({mois: {pays: {segment: objectif}}}), envoyée en
+# arrière-plan : les enregistrements rapprochés ne font qu'un commit
+def mirror_to_github(repository):
+    document = {}
+    for row in repository.get().itertuples():
+        document.setdefault(row.mois, {}).setdefault(row.pays, {})[row.segment] = int(row.objectif)
+    github_storage.save_objectifs(document)
+
 # Fonction pour créer la page des objectifs
-def objectifs_page(df):
+def objectifs_page(store):
     st.title(f'Objectifs de Clients Actifs pour {datetime.today().strftime("%B %Y")}')
 
-    # Récupérer les objectifs depuis le fichier Excel
-    objectifs_df = load_objectifs()
-
     # Calculer le mois actuel et le mois précédent
     today = datetime.today()
     current_month = today.replace(day=1)
     current_month_str = current_month.strftime('%Y-%m')
 
+    repository = get_objectifs_repository()
+    objectifs_df = to_objectifs_file(get_month_objectifs(repository, store, current_month_str))
+
     # Calculer les clients actuels pour le mois en cours
-    active_clients = get_active_clients(df, current_month_str)
+    active_clients = get_active_clients(store.version, current_month_str)
 
     # Préparer les données pour l'affichage
     rows = []
@@ -113,8 +138,31 @@ def objectifs_page(df):
     # Afficher le graphique en cascade
     st.plotly_chart(fig)
 
+    # Modifier les objectifs du mois (tous les pays enregistrés en une seule transaction)
+    st.header('Modifier les objectifs du mois')
+    edited = st.data_editor(
+        objectifs_df.rename(columns={'country': 'pays', 'type': 'segment', 'Nb clients': 'objectif'}),
+        disabled=['pays', 'segment'],
+        hide_index=True,
+        column_config={'objectif': st.column_config.NumberColumn(required=True, min_value=0, step=1)},
+        key='objectifs_editor',
+    )
+    if st.button('Enregistrer les objectifs'):
+        try:
+            st.session_state['objectifs_saved'] = repository.upsert(edited.assign(mois=current_month_str))
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            if github_storage.is_configured():
+                mirror_to_github(repository)
+            st.rerun()
+    if 'objectifs_saved' in st.session_state:
+        st.success(f"{st.session_state.pop('objectifs_saved')} objectif(s) modifié(s)")
+
+    with st.expander('Historique des objectifs du mois'):
+        st.dataframe(repository.history(current_month_str))
+
 # Appel de la fonction pour créer la page des objectifs
 if __name__ == "__main__":
     # Charger les données
-    historical_data, df = load_data()
-    objectifs_page(df)
+    objectifs_page(get_dataset_store())
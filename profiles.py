@@ -0,0 +1,41 @@
+import os
+import pandas as pd
+import streamlit as st
+import streamlit.components.v1 as components
+from src.profiler import PROFILES_DIR, list_captures, top_functions
+
+# Page d'administration : captures de profilage récentes (?profile=1 sur une page pour en créer une)
+def profiles_page(store):
+    st.title('Profils de rendu')
+    captures = list_captures()
+    if not captures:
+        st.info("Aucune capture. Ajoutez ?profile=1 (ou ?profile=sample) à l'URL d'une page pour profiler son prochain rendu.")
+        return
+
+    table = pd.DataFrame([
+        {
+            'Date': capture['created'],
+            'Page': capture['page'],
+            'Mode': capture['mode'],
+            'Durée (s)': round(capture['duration_s'], 3),
+            'Version': capture['version'],
+            'Paramètres': ', '.join(f'{key}={value}' for key, value in capture['params'].items()),
+        }
+        for capture in captures
+    ])
+    st.dataframe(table)
+
+    labels = [f"{capture['created']} - {capture['page']} ({capture['mode']})" for capture in captures]
+    selected = captures[labels.index(st.selectbox('Capture', labels))]
+
+    if selected['mode'] == 'sample':
+        with open(os.path.join(PROFILES_DIR, selected['name'] + '.svg')) as f:
+            svg = f.read()
+        components.html(svg, height=600, scrolling=True)
+    else:
+        sort = st.radio('Trier par', ['cumulative', 'tottime'], horizontal=True)
+        st.dataframe(top_functions(selected, sort=sort))
+
+    for artefact in selected['artefacts']:
+        with open(os.path.join(PROFILES_DIR, artefact), 'rb') as f:
+            st.download_button(f'Télécharger {artefact}', f.read(), file_name=artefact, key=f'download_{artefact}')
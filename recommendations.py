@@ -1,9 +1,12 @@
 import pandas as pd
 from datetime import datetime, timedelta
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer
+from src.similarity import SimilarityModel
+from src.peer_groups import PeerGroupSupport
+from src.replenishment import ReplenishmentTable
+from src.metrics import instrumented
 
-def get_recommendations(client_recent_purchases, client_previous_month_data, client_current_month_data, df_recent_purchases, segmentation_df, client_id):
+@instrumented()
+def get_recommendations(client_recent_purchases, client_previous_month_data, client_current_month_data, df_recent_purchases, segmentation_df, client_id, similarity_model=None, peer_support=None, replenishment=None):
     recommendations = []
 
     # Comparer les dépenses entre les deux mois dynamiques
@@ -23,24 +26,24 @@ def get_recommendations(client_recent_purchases, client_previous_month_data, cli
             "Détails": ""
         })
 
-    # Fréquence d'achat
-    if 'Fruits et Légumes' in client_recent_purchases['Product Category'].values:
-        last_fruit_veg_order_date = client_recent_purchases[client_recent_purchases['Product Category'] == 'Fruits et Légumes']['Date'].max()
-        last_fruit_veg_order_date = pd.to_datetime(last_fruit_veg_order_date, errors='coerce')
-        if (datetime.now() - last_fruit_veg_order_date).days > 7:
+    # Fréquence d'achat, comparée à la cadence habituelle du client (tables calculées pour tous les clients)
+    if replenishment is None:
+        replenishment = ReplenishmentTable(client_recent_purchases)
+    fruit_veg_status = replenishment.category_status(client_id, 'Fruits et Légumes')
+    if fruit_veg_status is not None:
+        if fruit_veg_status['En retard']:
             recommendations.append({
                 "Type": "Rachat de fruits et légumes",
                 "Recommandation": "Recommandez de racheter des fruits et légumes.",
-                "Détails": f"Le dernier achat de fruits et légumes a été effectué il y a {(datetime.now() - last_fruit_veg_order_date).days} jours."
+                "Détails": f"Le dernier achat de fruits et légumes a été effectué il y a {fruit_veg_status['Jours depuis le dernier achat']} jours{usual_interval(fruit_veg_status)}."
             })
     else:
-        last_order_date = client_recent_purchases['Date'].max()
-        last_order_date = pd.to_datetime(last_order_date, errors='coerce')
-        if (datetime.now() - last_order_date).days > 15:
+        client_status = replenishment.client_status(client_id)
+        if client_status is not None and client_status['En retard']:
             recommendations.append({
                 "Type": "Rachat dans d'autres catégories",
                 "Recommandation": "Recommandez de racheter dans d'autres catégories.",
-                "Détails": f"Le dernier achat a été effectué il y a {(datetime.now() - last_order_date).days} jours."
+                "Détails": f"Le dernier achat a été effectué il y a {client_status['Jours depuis le dernier achat']} jours{usual_interval(client_status)}."
             })
 
     # Nombre de catégories
@@ -74,18 +77,17 @@ def get_recommendations(client_recent_purchases, client_previous_month_data, cli
             "Détails": ""
         })
 
-    # Produits fréquemment achetés mais récemment non commandés
-    frequently_bought_products = client_recent_purchases.groupby('product_name').size().reset_index(name='counts').sort_values(by='counts', ascending=False)
-    product_recommendations = []
-    for product in frequently_bought_products['product_name'].unique():
-        last_product_order_date = client_recent_purchases[client_recent_purchases['product_name'] == product]['Date'].max()
-        last_product_order_date = pd.to_datetime(last_product_order_date, errors='coerce')
-        if (datetime.now() - last_product_order_date).days > 30:
-            product_recommendations.append({
-                "Produit": product,
-                "Dernier achat": last_product_order_date,
-                "Jours depuis le dernier achat": (datetime.now() - last_product_order_date).days
-            })
+    # Produits fréquemment achetés mais en retard par rapport à la cadence habituelle du client
+    overdue_products = replenishment.overdue_products(client_id)
+    product_recommendations = [
+        {
+            "Produit": product,
+            "Dernier achat": row['Dernier achat'],
+            "Jours depuis le dernier achat": row['Jours depuis le dernier achat'],
+            "Intervalle habituel (jours)": row['Intervalle médian'],
+        }
+        for product, row in overdue_products.iterrows()
+    ]
 
     if product_recommendations:
         recommendations.append({
@@ -94,21 +96,13 @@ def get_recommendations(client_recent_purchases, client_previous_month_data, cli
             "Détails": product_recommendations
         })
 
-    # Recommandations basées sur les restaurants similaires
+    # Recommandations basées sur les restaurants similaires (tables de support précalculées par (Gamme, Type))
+    if peer_support is None:
+        peer_support = PeerGroupSupport(df_recent_purchases, segmentation_df)
     client_info = segmentation_df[segmentation_df['Restaurant_id'] == client_id].iloc[0]
-    similar_restaurants = segmentation_df[(segmentation_df['Gamme'] == client_info['Gamme']) & (segmentation_df['Type'] == client_info['Type'])]
-    similar_restaurant_ids = similar_restaurants['Restaurant_id'].tolist()
-    similar_purchases = df_recent_purchases[df_recent_purchases['Restaurant_id'].isin(similar_restaurant_ids)]
-
-    # Calculer le support correctement
-    order_counts = similar_purchases['order_id'].nunique()
-    product_order_counts = similar_purchases.groupby('product_name')['order_id'].nunique().reset_index()
-    product_order_counts.columns = ['product_name', 'order_count']
-    product_order_counts = product_order_counts.merge(similar_purchases[['product_name', 'Product Category']].drop_duplicates(), on='product_name')
-    product_order_counts['Support (%)'] = product_order_counts['order_count'] / order_counts * 100
 
-    # Prendre les 10 produits les plus fréquents
-    top_recommendations = product_order_counts.sort_values(by='Support (%)', ascending=False).head(10)
+    # Prendre les 10 produits les plus fréquents que le client n'achète pas encore
+    top_recommendations = peer_support.top_products(client_info['Gamme'], client_info['Type'], exclude=client_recent_purchases['product_name'].unique())
 
     # Formater les recommandations
     product_recommendations = top_recommendations.to_dict('records')
@@ -119,16 +113,10 @@ def get_recommendations(client_recent_purchases, client_previous_month_data, cli
         "Détails": product_recommendations
     })
 
-    # Recommandations de filtrage collaboratif
-    client_purchases_matrix = df_recent_purchases.pivot_table(index='Restaurant_id', columns='product_name', values='GMV', aggfunc='sum', fill_value=0)
-    client_id_index = client_purchases_matrix.index.get_loc(client_id)
-    cosine_sim = cosine_similarity(client_purchases_matrix)
-    similar_indices = cosine_sim[client_id_index].argsort()[-101:-1][::-1]
-    similar_clients = client_purchases_matrix.index[similar_indices]
-    
-    similar_clients_purchases = df_recent_purchases[df_recent_purchases['Restaurant_id'].isin(similar_clients)]
-    similar_clients_top_products = similar_clients_purchases['product_name'].value_counts().head(10).index
-    similar_clients_recommendations = df_recent_purchases[df_recent_purchases['product_name'].isin(similar_clients_top_products)].groupby('product_name')['GMV'].sum().reset_index().sort_values(by='GMV', ascending=False)
+    # Recommandations de filtrage collaboratif (100 clients les plus similaires, lus dans le modèle précalculé)
+    if similarity_model is None:
+        similarity_model = SimilarityModel(df_recent_purchases)
+    similar_clients_recommendations = similarity_model.recommend_products(client_id)
 
     recommendations.append({
         "Type": "Filtrage collaboratif",
@@ -137,3 +125,31 @@ def get_recommendations(client_recent_purchases, client_previous_month_data, cli
     })
     
     return recommendations
+
+# Recommandations d'un client à partir des jeux de données du store (page Client Info et traitement par lots)
+@instrumented()
+def get_client_recommendations(store, client_id):
+    client_recent_purchases = store.purchases.client(client_id)
+
+    today = datetime.today()
+    current_month_index = today.year * 12 + today.month - 1
+    client_previous_data = store.purchases.client_month(client_id, current_month_index - 1)
+    client_current_data = store.purchases.client_month(client_id, current_month_index)
+
+    return get_recommendations(
+        client_recent_purchases,
+        client_previous_data,
+        client_current_data,
+        store.recent_purchases,
+        store.segmentation,
+        client_id,
+        store.similarity,
+        store.peer_support,
+        store.replenishment
+    )
+
+# Mention de l'intervalle habituel entre deux achats, quand la cadence du client est connue
+def usual_interval(status):
+    if pd.isna(status['Intervalle médian']):
+        return ""
+    return f" (habituellement tous les {status['Intervalle médian']:.0f} jours)"
@@ -2,20 +2,50 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from src.calculations import get_clients_by_segment_and_spending, get_inactive_clients
+from src.calculations import get_clients_by_segment_and_spending, get_segment_spending_history, compare_spending
+from src.tiering import SPENDING_LEVELS
+from src.months import month_index_from_str
 
-def segmentation_page(df):
+# Colonnes affichées pour un des deux mois comparés ('Previous' ou 'Current')
+def spending_view(clients, period):
+    view = clients.copy()
+    view['Segment'] = view[f'Segment_{period}']
+    view['Spending Level'] = view[f'Spending Level_{period}'].astype(object).fillna('Unknown')
+    view['Total_Previous'] = view['Total_Previous'].round()
+    view['Total_Current'] = view['Total_Current'].round()
+    view['Total'] = view[f'Total_{period}']
+    return view
+
+# Répartition des clients comparés sur deux mois (voir compare_spending) :
+# inactifs, baissés de catégorie, même catégorie mais dépense en baisse, dépense en hausse
+def spending_changes(clients):
+    still_active = clients['Actif_Previous'] & clients['Actif_Current']
+
+    # Clients actifs le mois précédent mais pas ce mois-ci
+    inactive_clients = spending_view(clients[clients['Actif_Previous'] & ~clients['Actif_Current']], 'Previous')
+
+    # Clients qui ont baissé dans le tiering
+    downgraded_clients = spending_view(clients[still_active & (clients['Spending Level_Previous'] > clients['Spending Level_Current'])], 'Current')
+
+    # Clients restés dans le même tiering mais dépensé moins
+    same_tier_less_spending_clients = spending_view(clients[
+        still_active
+        & (clients['Spending Level_Previous'] == clients['Spending Level_Current'])
+        & (clients['Total_Previous'] > clients['Total_Current'])
+    ], 'Current')
+
+    # Clients qui ont dépensé plus
+    increased_spending_clients = spending_view(clients[still_active & (clients['Total_Previous'] < clients['Total_Current'])], 'Current')
+
+    return inactive_clients, downgraded_clients, same_tier_less_spending_clients, increased_spending_clients
+
+def segmentation_page(store):
     st.title('Segmentation')
 
     # Sélectionner le pays
     selected_country = st.selectbox('Sélectionner un pays', ['Tous les pays', 'FR', 'US', 'GB', 'BE'])
-    if selected_country != 'Tous les pays':
-        df = df[df['Pays'] == selected_country]
-
-    # Ajouter la colonne de la dernière commande pour chaque Restaurant ID
-    df['Date de commande'] = pd.to_datetime(df['Date de commande'])
-    last_order_dates = df.groupby('Restaurant ID')['Date de commande'].max().reset_index()
-    last_order_dates.columns = ['Restaurant ID', 'Dernière commande']
+    country = None if selected_country == 'Tous les pays' else selected_country
+    df = store.scope('orders', country=country)
 
     # Calculer les mois dynamiques
     today = datetime.today()
@@ -25,8 +55,8 @@ def segmentation_page(df):
     previous_month_str = previous_month.strftime('%Y-%m')
 
     # Générer les heatmaps pour les mois dynamiques
-    heatmap_data_previous, total_clients_previous, customer_spending_previous = get_clients_by_segment_and_spending(df, previous_month_str)
-    heatmap_data_current, total_clients_current, customer_spending_current = get_clients_by_segment_and_spending(df, current_month_str)
+    heatmap_data_previous, total_clients_previous, customer_spending_previous = get_clients_by_segment_and_spending(store.version, previous_month_str, country=country)
+    heatmap_data_current, total_clients_current, customer_spending_current = get_clients_by_segment_and_spending(store.version, current_month_str, country=country)
 
     col1, col2 = st.columns(2)
 
@@ -48,7 +78,7 @@ def segmentation_page(df):
             xaxis_title='Niveau de Dépense',
             yaxis_title='Segment',
         )
-        st.plotly_chart(fig)
+        st.plotly_chart(fig, key='segmentation_previous')
 
     with col2:
         st.subheader(f'{current_month.strftime("%B %Y")}')
@@ -68,17 +98,34 @@ def segmentation_page(df):
             xaxis_title='Niveau de Dépense',
             yaxis_title='Segment',
         )
-        st.plotly_chart(fig)
+        st.plotly_chart(fig, key='segmentation_current')
+
+    # Historique sur 24 mois (niveaux et segments de tous les mois calculés en un seul passage)
+    history = get_segment_spending_history(store.version, 24, country=country)
+    history_by_level = history.groupby(['Mois', 'Spending Level'], as_index=False, observed=True)['Nombre de Clients'].sum()
+    fig = go.Figure([
+        go.Bar(
+            x=history_by_level.loc[history_by_level['Spending Level'] == level, 'Mois'],
+            y=history_by_level.loc[history_by_level['Spending Level'] == level, 'Nombre de Clients'],
+            name=level
+        )
+        for level in SPENDING_LEVELS
+    ])
+    fig.update_layout(
+        barmode='stack',
+        title='Clients actifs par niveau de dépense (24 derniers mois)',
+        xaxis_title='Mois',
+        yaxis_title='Nombre de Clients',
+    )
+    st.plotly_chart(fig, key='segmentation_history')
 
     # Segmentation par account manager
     st.header('Segmentation par Account Manager')
     account_manager = st.selectbox('Sélectionner un account manager', df['Owner email'].unique())
     
-    df_account = df[df['Owner email'] == account_manager]
-    
     # Réappliquer le calcul du segment et du spending level ici même pour les clients du mois en cours
-    heatmap_data_previous_account, total_clients_previous_account, customer_spending_previous_account = get_clients_by_segment_and_spending(df_account, previous_month_str)
-    heatmap_data_current_account, total_clients_current_account, customer_spending_current_account = get_clients_by_segment_and_spending(df_account, current_month_str)
+    heatmap_data_previous_account, total_clients_previous_account, customer_spending_previous_account = get_clients_by_segment_and_spending(store.version, previous_month_str, country=country, manager=account_manager)
+    heatmap_data_current_account, total_clients_current_account, customer_spending_current_account = get_clients_by_segment_and_spending(store.version, current_month_str, country=country, manager=account_manager)
 
     # Maintenant, s'assurer que les colonnes Segment et Spending Level sont bien mises à jour
     customer_spending_current_account['Segment'] = customer_spending_current_account['Segment'].fillna('Unknown')
@@ -104,7 +151,7 @@ def segmentation_page(df):
             xaxis_title='Niveau de Dépense',
             yaxis_title='Segment',
         )
-        st.plotly_chart(fig)
+        st.plotly_chart(fig, key='segmentation_account_previous')
 
     with col4:
         st.subheader(f'{current_month.strftime("%B %Y")} - {account_manager}')
@@ -124,93 +171,17 @@ def segmentation_page(df):
             xaxis_title='Niveau de Dépense',
             yaxis_title='Segment',
         )
-        st.plotly_chart(fig)
-
-    # Clients actifs en juin mais pas en juillet
-    inactive_clients = get_inactive_clients(customer_spending_previous_account, customer_spending_current_account)
-    inactive_clients = inactive_clients.merge(last_order_dates, on='Restaurant ID')
-    inactive_clients['Total'] = inactive_clients['Total'].round()
+        st.plotly_chart(fig, key='segmentation_account_current')
 
-    # Ajouter les colonnes manquantes après calcul
-    if 'Restaurant' not in inactive_clients.columns:
-        inactive_clients = inactive_clients.merge(df[['Restaurant ID', 'Restaurant']], on='Restaurant ID', how='left')
-    if 'Segment' not in inactive_clients.columns or inactive_clients['Segment'].isnull().all():
-        inactive_clients['Segment'] = 'Unknown'
-    if 'Spending Level' not in inactive_clients.columns or inactive_clients['Spending Level'].isnull().all():
-        inactive_clients['Spending Level'] = 'Unknown'
-
-    inactive_clients = inactive_clients.drop_duplicates(subset='Restaurant ID')
+    # Comparer les deux mois sur la table des restaurants (opérations vectorielles, sans groupby sur les commandes)
+    clients = compare_spending(
+        store.restaurants, customer_spending_previous_account, customer_spending_current_account,
+        month_index_from_str(previous_month_str), month_index_from_str(current_month_str)
+    )
+    inactive_clients, downgraded_clients, same_tier_less_spending_clients, increased_spending_clients = spending_changes(clients)
     inactive_count = inactive_clients.shape[0]
-
-    # Clients qui ont baissé dans le tiering
-    downgraded_clients = customer_spending_previous_account[
-        customer_spending_previous_account['Restaurant ID'].isin(customer_spending_current_account['Restaurant ID'])
-    ]
-    downgraded_clients = downgraded_clients.merge(customer_spending_current_account, on='Restaurant ID', suffixes=('_Previous', '_Current'))
-    downgraded_clients = downgraded_clients[downgraded_clients['Spending Level_Previous'] > downgraded_clients['Spending Level_Current']]
-    downgraded_clients = downgraded_clients.merge(last_order_dates, on='Restaurant ID')
-    downgraded_clients['Total_Previous'] = downgraded_clients['Total_Previous'].round()
-    downgraded_clients['Total_Current'] = downgraded_clients['Total_Current'].round()
-    downgraded_clients['Total'] = downgraded_clients['Total_Current']
-
-    # Ajouter les colonnes manquantes après calcul
-    if 'Restaurant' not in downgraded_clients.columns:
-        downgraded_clients = downgraded_clients.merge(df[['Restaurant ID', 'Restaurant']], on='Restaurant ID', how='left')
-    if 'Segment' not in downgraded_clients.columns or downgraded_clients['Segment'].isnull().all():
-        downgraded_clients['Segment'] = 'Unknown'
-    if 'Spending Level' not in downgraded_clients.columns or downgraded_clients['Spending Level'].isnull().all():
-        downgraded_clients['Spending Level'] = 'Unknown'
-
-    downgraded_clients = downgraded_clients.drop_duplicates(subset='Restaurant ID')
     downgraded_count = downgraded_clients.shape[0]
-
-    # Clients restés dans le même tiering mais dépensé moins en juillet
-    same_tier_less_spending_clients = customer_spending_previous_account[
-        customer_spending_previous_account['Restaurant ID'].isin(customer_spending_current_account['Restaurant ID'])
-    ]
-    same_tier_less_spending_clients = same_tier_less_spending_clients.merge(customer_spending_current_account, on='Restaurant ID', suffixes=('_Previous', '_Current'))
-    same_tier_less_spending_clients = same_tier_less_spending_clients[
-        (same_tier_less_spending_clients['Spending Level_Previous'] == same_tier_less_spending_clients['Spending Level_Current']) & 
-        (same_tier_less_spending_clients['Total_Previous'] > same_tier_less_spending_clients['Total_Current'])
-    ]
-    same_tier_less_spending_clients = same_tier_less_spending_clients.merge(last_order_dates, on='Restaurant ID')
-    same_tier_less_spending_clients['Total_Previous'] = same_tier_less_spending_clients['Total_Previous'].round()
-    same_tier_less_spending_clients['Total_Current'] = same_tier_less_spending_clients['Total_Current'].round()
-    same_tier_less_spending_clients['Total'] = same_tier_less_spending_clients['Total_Current']
-
-    # Ajouter les colonnes manquantes après calcul
-    if 'Restaurant' not in same_tier_less_spending_clients.columns:
-        same_tier_less_spending_clients = same_tier_less_spending_clients.merge(df[['Restaurant ID', 'Restaurant']], on='Restaurant ID', how='left')
-    if 'Segment' not in same_tier_less_spending_clients.columns or same_tier_less_spending_clients['Segment'].isnull().all():
-        same_tier_less_spending_clients['Segment'] = 'Unknown'
-    if 'Spending Level' not in same_tier_less_spending_clients.columns or same_tier_less_spending_clients['Spending Level'].isnull().all():
-        same_tier_less_spending_clients['Spending Level'] = 'Unknown'
-
-    same_tier_less_spending_clients = same_tier_less_spending_clients.drop_duplicates(subset='Restaurant ID')
     same_tier_less_spending_count = same_tier_less_spending_clients.shape[0]
-
-    # Clients restés dans le même tiering mais dépensé plus en juillet
-    increased_spending_clients = customer_spending_previous_account[
-        customer_spending_previous_account['Restaurant ID'].isin(customer_spending_current_account['Restaurant ID'])
-    ]
-    increased_spending_clients = increased_spending_clients.merge(customer_spending_current_account, on='Restaurant ID', suffixes=('_Previous', '_Current'))
-    increased_spending_clients = increased_spending_clients[
-        increased_spending_clients['Total_Previous'] < increased_spending_clients['Total_Current']
-    ]
-    increased_spending_clients = increased_spending_clients.merge(last_order_dates, on='Restaurant ID')
-    increased_spending_clients['Total_Previous'] = increased_spending_clients['Total_Previous'].round()
-    increased_spending_clients['Total_Current'] = increased_spending_clients['Total_Current'].round()
-    increased_spending_clients['Total'] = increased_spending_clients['Total_Current']
-
-    # Ajouter les colonnes manquantes après calcul
-    if 'Restaurant' not in increased_spending_clients.columns:
-        increased_spending_clients = increased_spending_clients.merge(df[['Restaurant ID', 'Restaurant']], on='Restaurant ID', how='left')
-    if 'Segment' not in increased_spending_clients.columns or increased_spending_clients['Segment'].isnull().all():
-        increased_spending_clients['Segment'] = 'Unknown'
-    if 'Spending Level' not in increased_spending_clients.columns or increased_spending_clients['Spending Level'].isnull().all():
-        increased_spending_clients['Spending Level'] = 'Unknown'
-
-    increased_spending_clients = increased_spending_clients.drop_duplicates(subset='Restaurant ID')
     increased_spending_count = increased_spending_clients.shape[0]
 
     # Récapitulatif
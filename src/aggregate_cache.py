@@ -0,0 +1,171 @@
+import copy
+import functools
+import inspect
+import sys
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from src.metrics import note_cache
+
+# Paramètres des fonctions en cache servant à l'invalidation sélective (nom du paramètre -> étiquette)
+TAG_PARAMETERS = {
+    'version': 'version',
+    'country': 'country',
+    'country_code': 'country',
+    'region': 'region',
+    'manager': 'manager',
+    'account_manager': 'manager',
+}
+TAGS = ['version', 'country', 'region', 'manager']
+
+
+# Taille approximative d'un résultat en mémoire (DataFrames, séries, conteneurs)
+def value_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(value_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(value_size(k) + value_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+# Cache des agrégats calculés, partagé par toutes les sessions du processus :
+# durée de vie par entrée, éviction LRU bornée en nombre d'entrées et en octets,
+# invalidation par version des données, pays, région ou account manager.
+class AggregateCache:
+    def __init__(self, max_entries=512, max_bytes=256 * 1024 * 1024, ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters['misses'] += 1
+                return False, None
+            if entry['expires'] is not None and entry['expires'] <= time.monotonic():
+                self._remove(key)
+                self.counters['expirations'] += 1
+                self.counters['misses'] += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return True, entry['value']
+
+    def put(self, key, value, tags, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        size = value_size(value)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = {
+                'value': value,
+                'tags': tags,
+                'size': size,
+                'expires': time.monotonic() + ttl if ttl else None,
+            }
+            self.total_bytes += size
+            # Éviction des entrées les moins récemment utilisées (la nouvelle entrée est conservée)
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                self._remove(next(iter(self.entries)))
+                self.counters['evictions'] += 1
+
+    # Supprimer les entrées dont les étiquettes correspondent à toutes celles fournies
+    # (ex. invalidate(manager='x') ou invalidate(country=None, manager=None) pour le périmètre global)
+    def invalidate(self, function=None, **tags):
+        unknown = set(tags) - set(TAGS)
+        if unknown:
+            raise ValueError(f"Étiquettes inconnues : {sorted(unknown)} (attendues : {TAGS})")
+        with self.lock:
+            keys = [
+                key for key, entry in self.entries.items()
+                if (function is None or key[0] == function)
+                and all(entry['tags'].get(tag) == value for tag, value in tags.items())
+            ]
+            for key in keys:
+                self._remove(key)
+            self.counters['invalidations'] += len(keys)
+            return len(keys)
+
+    # Supprimer les entrées calculées sur une autre version des données que celles fournies
+    def retain_version(self, *versions):
+        with self.lock:
+            keys = [key for key, entry in self.entries.items() if entry['tags'].get('version') not in versions]
+            for key in keys:
+                self._remove(key)
+            self.counters['invalidations'] += len(keys)
+            return len(keys)
+
+    # Reporter sur une nouvelle version les entrées que ses changements n'affectent pas :
+    # keep(arguments) reçoit les arguments de l'appel (dictionnaire) de chaque entrée de l'ancienne version
+    def carry_over(self, old_version, new_version, keep):
+        with self.lock:
+            carried = []
+            for (name, arguments), entry in self.entries.items():
+                if entry['tags'].get('version') == old_version and keep(dict(arguments)):
+                    arguments = tuple((parameter, new_version if parameter == 'version' else value) for parameter, value in arguments)
+                    carried.append(((name, arguments), entry))
+        for key, entry in carried:
+            self.put(key, entry['value'], {**entry['tags'], 'version': new_version})
+        return len(carried)
+
+    def clear(self):
+        with self.lock:
+            self.counters['invalidations'] += len(self.entries)
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'hit_rate': self.counters['hits'] / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry['size']
+
+
+# Instance unique du processus
+aggregate_cache = AggregateCache()
+
+
+# Décorateur : mettre en cache le résultat d'une fonction indexée par des scalaires (version, mois, pays...).
+# Comme st.cache_data, chaque appel reçoit une copie, qu'une page peut modifier sans altérer le cache.
+def cached_aggregate(ttl=None, cache=aggregate_cache):
+    def decorator(func):
+        signature = inspect.signature(func)
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (name, tuple(bound.arguments.items()))
+            found, value = cache.get(key)
+            note_cache(found)
+            if not found:
+                value = func(*args, **kwargs)
+                tags = dict.fromkeys(TAGS)
+                for parameter, tag in TAG_PARAMETERS.items():
+                    if parameter in bound.arguments:
+                        tags[tag] = bound.arguments[parameter]
+                cache.put(key, value, tags, ttl=ttl)
+            return copy.deepcopy(value)
+
+        wrapper.cache_name = name
+        return wrapper
+    return decorator
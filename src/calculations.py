@@ -1,57 +1,44 @@
 import pandas as pd
 import numpy as np
-import streamlit as st
 from datetime import datetime, timedelta
+from src.cohort_cube import build_cohort_cube, count_restaurants
+from src.months import month_index, month_index_from_str, month_str_from_index
+from src.tiering import SPENDING_LEVELS, SPENDING_THRESHOLDS, spending_levels, segment_labels, tier_segment_counts
+from src.restaurants import RestaurantTable
+from src.dataset_store import get_dataset_store
+from src.aggregate_cache import cached_aggregate
+from src.retention_history import scope_level
+from src.metrics import instrumented
 
 # Fonction de segmentation des clients par niveau de dépense
-def segment_customers(data, year, month):
-    # Convertir 'Date de commande' en datetime
-    data['Date de commande'] = pd.to_datetime(data['Date de commande'], format='%Y-%m-%d %H:%M:%S')
-    
+@instrumented()
+def segment_customers(data, year, month, thresholds=SPENDING_THRESHOLDS):
     # Filtrer les données pour le mois et l'année spécifiés
-    filtered_data = data[(data['Date de commande'].dt.year == year) & 
-                         (data['Date de commande'].dt.month == month)]
+    order_month = data['Mois Index'] if 'Mois Index' in data.columns else month_index(data['Date de commande'])
+    filtered_data = data[order_month == year * 12 + month - 1]
+    if 'Mois 1ere commande Index' not in filtered_data.columns:
+        filtered_data = filtered_data.assign(**{'Mois 1ere commande Index': month_index(filtered_data['date 1ere commande (Restaurant)'])})
     
     # Calculer le montant total dépensé par chaque client dans le mois spécifié
-    customer_spending = filtered_data.groupby('Restaurant ID').agg({
+    customer_spending = filtered_data.groupby('Restaurant ID', observed=True).agg({
         'Total': 'sum',
-        'Restaurant': 'first'  # Obtenir le nom du restaurant
+        'Restaurant': 'first',  # Obtenir le nom du restaurant
+        'Mois 1ere commande Index': 'first'
     }).reset_index()
     
-    # Définir les critères de segmentation
-    def categorize_customer(spent):
-        if spent <= 500:
-            return 'Basic'
-        elif 500 < spent <= 1500:
-            return 'Silver'
-        elif 1500 < spent <= 2000:
-            return 'Gold'
-        else:
-            return 'High Spenders'
-    
-    # Appliquer la catégorisation
-    customer_spending['Spending Level'] = customer_spending['Total'].apply(categorize_customer)
+    # Appliquer la catégorisation (bornes de niveaux de dépense)
+    customer_spending['Spending Level'] = spending_levels(customer_spending['Total'].to_numpy(), thresholds).astype(object)
     
     return customer_spending
 
 # Fonction pour obtenir les clients par segment et niveau de dépense
-@st.cache_data
-def get_clients_by_segment_and_spending(df, target_month):
+@instrumented()
+def clients_by_segment_and_spending(df, target_month):
     year, month = map(int, target_month.split('-'))
     customer_spending = segment_customers(df, year, month)
     
-    # Définir les segments
-    acquisition = df[df['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') == target_month]
-    nouveaux_clients = df[df['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') == (pd.to_datetime(target_month) - pd.DateOffset(months=1)).strftime('%Y-%m')]
-    clients_recents = df[df['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m').isin(
-        [(pd.to_datetime(target_month) - pd.DateOffset(months=i)).strftime('%Y-%m') for i in range(2, 6)]
-    )]
-    anciens_clients = df[df['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') < (pd.to_datetime(target_month) - pd.DateOffset(months=6)).strftime('%Y-%m')]
-    
-    customer_spending.loc[customer_spending['Restaurant ID'].isin(acquisition['Restaurant ID']), 'Segment'] = 'Acquisition'
-    customer_spending.loc[customer_spending['Restaurant ID'].isin(nouveaux_clients['Restaurant ID']), 'Segment'] = 'Nouveaux Clients'
-    customer_spending.loc[customer_spending['Restaurant ID'].isin(clients_recents['Restaurant ID']), 'Segment'] = 'Clients Récents'
-    customer_spending.loc[customer_spending['Restaurant ID'].isin(anciens_clients['Restaurant ID']), 'Segment'] = 'Anciens Clients'
+    # Définir les segments à partir de l'écart entre le mois cible et le mois de 1ère commande
+    customer_spending['Segment'] = segment_labels(customer_spending['Mois 1ere commande Index'].to_numpy(), month_index_from_str(target_month)).astype(object)
     
     # Compter les clients par segment et niveau de dépense
     heatmap_data = customer_spending.groupby(['Segment', 'Spending Level']).agg({'Restaurant ID': 'nunique'}).reset_index()
@@ -63,82 +50,120 @@ def get_clients_by_segment_and_spending(df, target_month):
     
     return heatmap_pivot, total_clients, customer_spending
 
+# Les fonctions en cache ci-dessous sont indexées par la version du jeu de données et des scalaires
+# (mois, pays, région, account manager) : les DataFrames viennent du store et ne sont jamais hachés.
+@instrumented()
+@cached_aggregate()
+def get_clients_by_segment_and_spending(version, target_month, country=None, manager=None):
+    orders = get_dataset_store(version).scope('orders', country=country, manager=manager)
+    return clients_by_segment_and_spending(orders, target_month)
+
+# Historique des clients actifs par mois, segment et niveau de dépense (tous les mois en un seul passage)
+@instrumented()
+@cached_aggregate()
+def get_segment_spending_history(version, n_months=24, country=None):
+    store = get_dataset_store(version)
+    restaurants = store.restaurants if country is None else RestaurantTable(store.scope('orders', country=country))
+    counts = tier_segment_counts(restaurants)
+    counts = counts[counts['Mois Index'] > counts['Mois Index'].max() - n_months]
+    counts['Mois'] = [month_str_from_index(month) for month in counts['Mois Index']]
+    return counts
+
 # Fonction pour obtenir les clients à réactiver
 def get_inactive_clients(previous_df, current_df):
     inactive_clients = previous_df[~previous_df['Restaurant ID'].isin(current_df['Restaurant ID'])]
     return inactive_clients
 
-@st.cache_data
-def calculate_segments_for_month(df, target_month):
-    previous_month = (pd.to_datetime(target_month) - pd.DateOffset(months=1)).strftime('%Y-%m')
-    target_orders = df[df['Date de commande'].dt.strftime('%Y-%m') == target_month]
-    acquisition = target_orders[target_orders['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') == target_month]
-    nouveaux_clients = target_orders[target_orders['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') == previous_month]
-    clients_recents = target_orders[target_orders['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m').isin(
-        [(pd.to_datetime(target_month) - pd.DateOffset(months=i)).strftime('%Y-%m') for i in range(2, 6)]
-    )]
-    anciens_clients = target_orders[target_orders['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') < (pd.to_datetime(target_month) - pd.DateOffset(months=6)).strftime('%Y-%m')]
+# Comparer deux mois pour les clients actifs sur l'un ou l'autre, avec les dépenses de la table des restaurants
+@instrumented()
+def compare_spending(restaurants, previous_spending, current_spending, previous_month, current_month):
+    previous = previous_spending.set_index('Restaurant ID')
+    current = current_spending.set_index('Restaurant ID')
+    ids = previous.index.union(current.index)
+    positions = restaurants.positions(ids)
+
+    levels = pd.CategoricalDtype(SPENDING_LEVELS, ordered=True)
+    clients = restaurants.table.iloc[positions][['Restaurant', 'Dernière commande']].reset_index()
+    clients['Actif_Previous'] = ids.isin(previous.index)
+    clients['Actif_Current'] = ids.isin(current.index)
+    clients['Total_Previous'] = restaurants.monthly_spend(previous_month, positions)
+    clients['Total_Current'] = restaurants.monthly_spend(current_month, positions)
+    clients['Segment_Previous'] = previous['Segment'].reindex(ids).fillna('Unknown').to_numpy()
+    clients['Segment_Current'] = current['Segment'].reindex(ids).fillna('Unknown').to_numpy()
+    clients['Spending Level_Previous'] = pd.Categorical(previous['Spending Level'].reindex(ids), dtype=levels)
+    clients['Spending Level_Current'] = pd.Categorical(current['Spending Level'].reindex(ids), dtype=levels)
+    return clients
+
+@instrumented()
+def segments_for_month(df, target_month):
+    # Les segments sont calculés sur le cube de cohortes (construit une seule fois au chargement)
+    cube = build_cohort_cube(df)
+    order_month = cube['Mois Index']
+    first_month = cube['Mois 1ere commande Index']
+    month = month_index_from_str(target_month)
+    previous_month = month - 1
+    target_orders = order_month == month
+    previous_orders = order_month == previous_month
+    recent_clients = first_month.between(month - 5, month - 2)
+
+    acquisition = count_restaurants(cube, target_orders & (first_month == month))
     segment_counts = {
         'Segment': ['Acquisition', 'Nouveaux Clients', 'Clients Récents', 'Anciens Clients'],
-        'Nombre de Clients': [len(acquisition['Restaurant ID'].unique()), len(nouveaux_clients['Restaurant ID'].unique()), len(clients_recents['Restaurant ID'].unique()), len(anciens_clients['Restaurant ID'].unique())]
+        'Nombre de Clients': [
+            acquisition,
+            count_restaurants(cube, target_orders & (first_month == previous_month)),
+            count_restaurants(cube, target_orders & recent_clients),
+            count_restaurants(cube, target_orders & (first_month < month - 6))
+        ]
     }
-    all_previous_acquisitions = df[(df['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') == previous_month)]
-    all_recent_clients = df[(df['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m').isin(
-        [(pd.to_datetime(previous_month) - pd.DateOffset(months=i)).strftime('%Y-%m') for i in range(1, 5)]
-    ))]
-    all_old_clients = df[(df['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') < (pd.to_datetime(previous_month) - pd.DateOffset(months=6)).strftime('%Y-%m'))]
     segment_counts['Nombre de Clients Possible'] = [
-        len(acquisition['Restaurant ID'].unique()),
-        len(all_previous_acquisitions['Restaurant ID'].unique()),
-        len(all_recent_clients['Restaurant ID'].unique()),
-        len(all_old_clients['Restaurant ID'].unique())
+        acquisition,
+        count_restaurants(cube, first_month == previous_month),
+        count_restaurants(cube, recent_clients),
+        count_restaurants(cube, first_month < previous_month - 6)
     ]
-    previous_orders = df[df['Date de commande'].dt.strftime('%Y-%m') == previous_month]
-    acquisition_previous = 0
-    new_clients_previous = len(previous_orders[previous_orders['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') == previous_month]['Restaurant ID'].unique())
-    recent_clients_previous = len(previous_orders[previous_orders['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m').isin(
-        [(pd.to_datetime(previous_month) - pd.DateOffset(months=i)).strftime('%Y-%m') for i in range(1, 5)]
-    )]['Restaurant ID'].unique())
-    old_clients_previous = len(previous_orders[previous_orders['date 1ere commande (Restaurant)'].dt.strftime('%Y-%m') < (pd.to_datetime(previous_month) - pd.DateOffset(months=6)).strftime('%Y-%m')]['Restaurant ID'].unique())
     segment_counts['Nombre de Clients Actifs (Mois Précédent)'] = [
-        acquisition_previous,
-        new_clients_previous,
-        recent_clients_previous,
-        old_clients_previous
+        0,
+        count_restaurants(cube, previous_orders & (first_month == previous_month)),
+        count_restaurants(cube, previous_orders & recent_clients),
+        count_restaurants(cube, previous_orders & (first_month < previous_month - 6))
     ]
     segment_counts['Rapport (%)'] = np.round(np.divide(segment_counts['Nombre de Clients'], segment_counts['Nombre de Clients Actifs (Mois Précédent)'], out=np.zeros_like(segment_counts['Nombre de Clients'], dtype=float), where=np.array(segment_counts['Nombre de Clients Actifs (Mois Précédent)']) != 0) * 100, 1)
     results_df = pd.DataFrame(segment_counts)
     results_df['Mois'] = target_month
     return results_df
 
-@st.cache_data
-def process_country_data(df, historical_data, country_code, region=None):
-    historical_results = historical_data[country_code]
-    df_country = df[df['Pays'] == country_code]
-    
-    if region:
-        if 'region' in df_country.columns:
-            df_country = df_country[df_country['region'] == region]
-        else:
-            raise KeyError(f"La colonne 'region' n'existe pas dans le DataFrame. Colonnes disponibles : {df_country.columns}")
+@instrumented()
+@cached_aggregate()
+def calculate_segments_for_month(version, target_month, country=None, region=None, manager=None):
+    cube = get_dataset_store(version).scope('cohort_cube', country=country, region=region, manager=manager)
+    return segments_for_month(cube, target_month)
 
-    today = datetime.today()
-    current_month = today.replace(day=1)
-    start_month = (current_month - pd.DateOffset(months=3)).strftime('%Y-%m')
-    recent_months = pd.date_range(start=start_month, end=current_month, freq='MS').strftime('%Y-%m').tolist()
-    recent_results = pd.concat([calculate_segments_for_month(df_country, month) for month in recent_months], ignore_index=True)
-    all_results = pd.concat([historical_results, recent_results], ignore_index=True)
-    
-    return all_results
+# Résultats de rétention de tous les mois d'un périmètre (global, pays, région ou account manager) :
+# les mois clos sont lus dans l'historique (complété des mois clos manquants), seuls les mois
+# suivants jusqu'au mois en cours sont calculés
+@instrumented()
+@cached_aggregate()
+def retention_results(version, country=None, region=None, manager=None):
+    if scope_level(country, region, manager) is None:
+        raise ValueError(f"Périmètre absent de l'historique de rétention : pays={country}, région={region}, manager={manager}")
+    store = get_dataset_store(version)
+    history = store.retention_history
+    history.update(store.cohort_cube)
+    stored = history.results(country=country, region=region, manager=manager)
 
-@st.cache_data
-def process_region_data(df, country_code, region):
-    df_region = df[(df['Pays'] == country_code) & (df['region'] == region)]
-    
+    months = history.months()
     today = datetime.today()
-    current_month = today.replace(day=1)
-    start_month = (current_month - pd.DateOffset(months=2)).strftime('%Y-%m')
-    recent_months = pd.date_range(start=start_month, end=current_month, freq='MS').strftime('%Y-%m').tolist()
-    recent_results = pd.concat([calculate_segments_for_month(df_region, month) for month in recent_months], ignore_index=True)
-    
-    return recent_results
+    current_month = today.year * 12 + today.month - 1
+    first_live = month_index_from_str(months[-1]) + 1 if months else current_month
+    live_months = [month_str_from_index(month) for month in range(first_live, current_month + 1)]
+    live_results = [calculate_segments_for_month(version, month, country=country, region=region, manager=manager) for month in live_months]
+    return pd.concat([results for results in [stored] + live_results if not results.empty], ignore_index=True)
+
+@instrumented()
+def process_country_data(version, country_code, region=None):
+    return retention_results(version, country=country_code, region=region)
+
+@instrumented()
+def process_region_data(version, country_code, region):
+    return retention_results(version, country=country_code, region=region)
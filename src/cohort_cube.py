@@ -0,0 +1,33 @@
+import pandas as pd
+from src.months import month_index
+
+# Dimensions du cube de cohortes : une ligne par restaurant actif et par combinaison
+# (mois d'activité, mois de 1ère commande, pays, région, account manager)
+CUBE_KEYS = ['Restaurant ID', 'Mois Index', 'Mois 1ere commande Index', 'Pays', 'region', 'Owner email']
+
+
+def is_cohort_cube(df):
+    return 'Mois 1ere commande Index' in df.columns and 'Date de commande' not in df.columns
+
+
+# Construire le cube une seule fois à partir des commandes (index de mois entiers)
+def build_cohort_cube(df):
+    if is_cohort_cube(df):
+        return df
+
+    cube = pd.DataFrame({
+        'Restaurant ID': df['Restaurant ID'],
+        'Mois Index': df['Mois Index'] if 'Mois Index' in df.columns else month_index(df['Date de commande']),
+        'Mois 1ere commande Index': df['Mois 1ere commande Index'] if 'Mois 1ere commande Index' in df.columns else month_index(df['date 1ere commande (Restaurant)']),
+        'Pays': df['Pays'] if 'Pays' in df.columns else None,
+        'region': df['region'] if 'region' in df.columns else None,
+        'Owner email': df['Owner email'] if 'Owner email' in df.columns else None,
+    })
+    cube = cube.drop_duplicates(subset=CUBE_KEYS).reset_index(drop=True)
+    return cube
+
+
+# Nombre de restaurants distincts dans une tranche du cube
+def count_restaurants(cube, mask):
+    return int(cube.loc[mask, 'Restaurant ID'].nunique())
+
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+import pyarrow.compute as pc
+
+# Répertoire du cache Parquet (une conversion par fichier source)
+CACHE_DIR = os.path.join('data', 'cache')
+
+# À incrémenter quand le format des fichiers convertis change (force la reconstruction)
+CACHE_VERSION = 5
+
+# Des row groups de taille modérée permettent d'ignorer des blocs entiers lors des filtres
+ROW_GROUP_SIZE = 100_000
+
+# Au-delà de ce nombre d'incréments, le fichier principal est réécrit avec les incréments fusionnés
+MAX_INCREMENTS = 30
+
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _cache_paths(source_path):
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(CACHE_DIR, f'{name}.parquet'), os.path.join(CACHE_DIR, f'{name}.meta.json')
+
+
+# Incréments ajoutés par le rafraîchissement : <nom>.increments/<AAAAMMJJ>.parquet, chacun remplaçant
+# toutes les lignes dont la date est postérieure ou égale à son début
+def _increment_dir(source_path):
+    return os.path.splitext(_cache_paths(source_path)[0])[0] + '.increments'
+
+
+def increment_starts(source_path):
+    directory = _increment_dir(source_path)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(pd.Timestamp(name[:-len('.parquet')]) for name in os.listdir(directory) if name.endswith('.parquet'))
+
+
+def _increment_path(source_path, start):
+    return os.path.join(_increment_dir(source_path), f'{start:%Y%m%d}.parquet')
+
+
+def _read_meta(meta_path):
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r') as f:
+        return json.load(f)
+
+
+def _write_meta(meta_path, meta):
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+# Les colonnes objet de type mixte (ex. nombres et textes dans un xlsx) ne passent pas en Arrow
+def _arrow_safe(df):
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def _write_parquet(df, parquet_path):
+    tmp_path = parquet_path + '.tmp'
+    _arrow_safe(df).to_parquet(tmp_path, index=False, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, parquet_path)
+
+
+# Concaténer des DataFrames en conservant les colonnes catégorielles (union des catégories)
+def concat_frames(frames):
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+    for col in frames[0].columns:
+        if all(isinstance(frame[col].dtype, pd.CategoricalDtype) for frame in frames):
+            categories = pd.api.types.union_categoricals([frame[col] for frame in frames], ignore_order=True).categories
+            frames = [frame.assign(**{col: frame[col].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+# Vérifier si le cache correspond toujours au fichier source (mtime/taille, sinon hash du contenu)
+def is_cache_fresh(source_path):
+    parquet_path, meta_path = _cache_paths(source_path)
+    meta = _read_meta(meta_path)
+    if meta is None or meta.get('version') != CACHE_VERSION or not os.path.exists(parquet_path):
+        return False
+    stat = _file_stat(source_path)
+    if meta['mtime_ns'] == stat['mtime_ns'] and meta['size'] == stat['size']:
+        return True
+    if meta['sha256'] == file_hash(source_path):
+        # Fichier touché sans modification du contenu : mettre à jour la signature
+        _write_meta(meta_path, {**meta, **stat})
+        return True
+    return False
+
+
+# Hash du fichier source dont le cache est la conversion (None sans cache)
+def cached_source_hash(source_path):
+    meta = _read_meta(_cache_paths(source_path)[1])
+    return None if meta is None else meta['sha256']
+
+
+# Octets économisés par colonne à la dernière conversion de la source (voir data_processing.compact_frame)
+def cached_compaction_report(source_path):
+    meta = _read_meta(_cache_paths(source_path)[1])
+    return [] if meta is None else meta.get('compaction', [])
+
+
+# Lire une source via son cache Parquet, en la convertissant une seule fois avec read_source.
+# columns et filters (expression pyarrow) sont appliqués à la lecture du Parquet.
+def read_cached(source_path, read_source, columns=None, filters=None):
+    parquet_path, meta_path = _cache_paths(source_path)
+    if not is_cache_fresh(source_path):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Les incréments portaient sur l'ancienne conversion
+        shutil.rmtree(_increment_dir(source_path), ignore_errors=True)
+        df = read_source(source_path)
+        _write_parquet(df, parquet_path)
+        _write_meta(meta_path, {**_file_stat(source_path), 'sha256': file_hash(source_path), 'version': CACHE_VERSION, 'compaction': df.attrs.get('compaction', [])})
+        if columns is None and filters is None:
+            return df
+
+    starts = increment_starts(source_path)
+    if not starts:
+        return pd.read_parquet(parquet_path, columns=columns, filters=filters)
+
+    # Chaque fichier fournit les lignes de sa plage de dates [début, début de l'incrément suivant)
+    date = pc.field(_read_meta(meta_path)['increment_column'])
+    parts = [(parquet_path, date.is_null() | (date < starts[0].to_pydatetime()))]
+    for start, stop in zip(starts, starts[1:] + [None]):
+        in_range = date >= start.to_pydatetime()
+        if stop is not None:
+            in_range &= date < stop.to_pydatetime()
+        parts.append((_increment_path(source_path, start), in_range))
+    return concat_frames(
+        pd.read_parquet(path, columns=columns, filters=in_range if filters is None else filters & in_range)
+        for path, in_range in parts
+    )
+
+
+# Ajouter les lignes d'une source dont la date (date_column) est postérieure ou égale à start, sans
+# reconvertir la source : les incréments suivants sont remplacés et la signature du cache est mise
+# à jour avec celle de la nouvelle source, dont les lignes antérieures à start sont inchangées.
+def append_increment(source_path, df, start, date_column):
+    parquet_path, meta_path = _cache_paths(source_path)
+    meta = _read_meta(meta_path)
+    if meta is None or meta.get('version') != CACHE_VERSION or not os.path.exists(parquet_path):
+        raise ValueError(f"Aucune conversion Parquet de {source_path} à compléter")
+
+    start = pd.Timestamp(start)
+    directory = _increment_dir(source_path)
+    os.makedirs(directory, exist_ok=True)
+    for previous in increment_starts(source_path):
+        if previous > start:
+            os.remove(_increment_path(source_path, previous))
+    _write_parquet(df, _increment_path(source_path, start))
+    _write_meta(meta_path, {**meta, **_file_stat(source_path), 'sha256': file_hash(source_path), 'increment_column': date_column})
+
+    if len(increment_starts(source_path)) > MAX_INCREMENTS:
+        compact_increments(source_path)
+
+
+# Réécrire le fichier principal avec ses incréments (lecture complète, exécutée rarement)
+def compact_increments(source_path):
+    parquet_path, meta_path = _cache_paths(source_path)
+    df = read_cached(source_path, None)
+    _write_parquet(df, parquet_path)
+    shutil.rmtree(_increment_dir(source_path), ignore_errors=True)
@@ -1,7 +1,11 @@
 import pandas as pd
-import gdown
+import numpy as np
 import os
-import streamlit as st
+import pyarrow as pa
+import pyarrow.compute as pc
+from src.columnar_cache import read_cached
+from src.months import add_order_month_columns, add_purchase_month_column
+from src.metrics import instrumented
 
 # URL de Google Drive pour les fichiers
 prepared_data_url = 'https://drive.google.com/uc?id=1krOrcWcYr2F_shA4gUYZ1AQFsuWja9dM'
@@ -9,103 +13,186 @@ objectifs_url = 'https://drive.google.com/uc?id=17TDM9d4MqXxmj1JC4pv0G9nDjRqKEtX
 recent_purchases_url = 'https://drive.google.com/uc?id=1sv6E1UsMV3fe-T_3p94uAUt1kz4xlXZA'
 segmentation_url = 'https://drive.google.com/uc?id=1lCVTDYtM_SWj1W5OqTr15-56K4BCWPqf'
 
-@st.cache_data
-def download_prepared_data():
-    data_dir = 'data'
-    os.makedirs(data_dir, exist_ok=True)
-    
-    output_prepared = os.path.join(data_dir, 'prepared_data.csv')
-    output_objectifs = os.path.join(data_dir, 'objectifs.xlsx')
-    output_recent_purchases = os.path.join(data_dir, 'dataFR.xlsx')
-    output_segmentation = os.path.join(data_dir, 'segmentation_data.xlsx')
-    
-    if not os.path.exists(output_prepared):
-        gdown.download(prepared_data_url, output_prepared, quiet=False)
-    if not os.path.exists(output_objectifs):
-        gdown.download(objectifs_url, output_objectifs, quiet=False)
-    if not os.path.exists(output_recent_purchases):
-        gdown.download(recent_purchases_url, output_recent_purchases, quiet=False)
-    if not os.path.exists(output_segmentation):
-        gdown.download(segmentation_url, output_segmentation, quiet=False)
-
-@st.cache_data
-def load_data():
-    data_dir = 'data'
-    
-    # Vérifier et télécharger les données préparées si nécessaire
-    download_prepared_data()
-
-    historical_files = {
-        'FR': os.path.join(data_dir, 'historical_retention_analysis_FR.csv'),
-        'US': os.path.join(data_dir, 'historical_retention_analysis_US.csv'),
-        'BE': os.path.join(data_dir, 'historical_retention_analysis_BE.csv'),
-        'GB': os.path.join(data_dir, 'historical_retention_analysis_GB.csv')
-    }
-
-    historical_data = {country: pd.read_csv(file) for country, file in historical_files.items()}
-    df = pd.read_csv(os.path.join(data_dir, 'prepared_data.csv'), parse_dates=['date 1ere commande (Restaurant)', 'Date de commande'], decimal='.')
-    
-    to_exclude_commande = ['CANCELLED', 'ABANDONED', 'FAILED', 'WAITING']
-    to_exclude_paiement = ['CANCELLED', 'ERROR']
-    df = df[~df['Statut commande'].isin(to_exclude_commande)]
-    df = df[~df['Statut paiement'].isin(to_exclude_paiement)]
-    df = df[~df['Canal'].str.contains('trading', case=False, na=False)]
+# Schémas de compaction : textes répétitifs en catégories, identifiants en int32, montants en float32
+ORDERS_SCHEMA = {
+    'category': ['Restaurant', 'Pays', 'region', 'Owner email', 'Statut commande', 'Statut paiement', 'Canal'],
+    'id': ['Restaurant ID'],
+    'amount': ['Total'],
+}
+PURCHASES_SCHEMA = {
+    'category': ['Product Category', 'sub_cat', 'Supplier', 'product_name'],
+    'id': ['Restaurant_id', 'order_id'],
+    'amount': ['GMV'],
+}
+
+# Colonnes des commandes utilisées par les pages (les autres ne sont pas chargées en mémoire)
+ORDER_COLUMNS = [
+    'Restaurant ID', 'Restaurant', 'Date de commande', 'date 1ere commande (Restaurant)',
+    'Pays', 'region', 'Owner email', 'Total', 'Mois Index', 'Mois 1ere commande Index'
+]
+
+# Commandes exclues des analyses
+to_exclude_commande = ['CANCELLED', 'ABANDONED', 'FAILED', 'WAITING']
+to_exclude_paiement = ['CANCELLED', 'ERROR']
+
+# Sources téléchargeables : fichier local dans data/ et URL Google Drive
+SOURCES = {
+    'prepared_data': (os.path.join('data', 'prepared_data.csv'), prepared_data_url),
+    'objectifs': (os.path.join('data', 'objectifs.xlsx'), objectifs_url),
+    'recent_purchases': (os.path.join('data', 'dataFR.xlsx'), recent_purchases_url),
+    'segmentation': (os.path.join('data', 'segmentation_data.xlsx'), segmentation_url),
+}
+
+# Télécharger une source une seule fois (écriture atomique), à la création du store (sa version est
+# calculée sur les fichiers téléchargés) ; sans effet si le fichier est déjà présent.
+# Le contenu est ensuite converti une fois en Parquet, dont le cache est validé par le hash du fichier.
+def fetch_source(name):
+    path, url = SOURCES[name]
+    if not os.path.exists(path):
+        import gdown
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.download'
+        gdown.download(url, tmp_path, quiet=False)
+        os.replace(tmp_path, path)
+    return path
+
+def fetch_all_sources():
+    return [fetch_source(name) for name in SOURCES]
+
+# Un identifiant passe en int32 seulement s'il est entier, sans valeur manquante et dans les bornes
+def _can_downcast_id(col):
+    if not pd.api.types.is_numeric_dtype(col) or col.isna().any():
+        return False
+    info = np.iinfo(np.int32)
+    return bool((col % 1 == 0).all()) and col.min() >= info.min and col.max() <= info.max
+
+# Un montant passe en float32 seulement si chaque valeur est conservée au centime près
+def _can_downcast_amount(col):
+    if not pd.api.types.is_float_dtype(col):
+        return False
+    values = col.to_numpy(dtype='float64', na_value=np.nan)
+    return bool(np.all(np.isnan(values) | (np.abs(values.astype('float32') - values) < 0.005)))
+
+# Compacter les colonnes d'un DataFrame selon un schéma. Les octets économisés par colonne sont
+# joints au DataFrame (df.attrs['compaction']) : read_cached les conserve dans les métadonnées du cache.
+def compact_frame(df, schema, name=None):
+    report = []
+    for kind, columns in schema.items():
+        for col in columns:
+            if col not in df.columns:
+                continue
+            before = int(df[col].memory_usage(index=False, deep=True))
+            if kind == 'category' and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+            elif kind == 'id' and df[col].dtype != 'int32' and _can_downcast_id(df[col]):
+                df[col] = df[col].astype('int32')
+            elif kind == 'amount' and df[col].dtype != 'float32' and _can_downcast_amount(df[col]):
+                df[col] = df[col].astype('float32')
+            after = int(df[col].memory_usage(index=False, deep=True))
+            report.append({'Colonne': col, 'Avant (octets)': before, 'Après (octets)': after, 'Gain (octets)': before - after})
+
+    if name is not None:
+        df.attrs['compaction'] = [{'Jeu de données': name, **row} for row in report]
+    return df
+
+# Lignes lues à la fois quand seules les commandes récentes du CSV sont conservées
+CSV_CHUNK_SIZE = 200_000
+
+# Lire le CSV des commandes et typer les colonnes (exécuté uniquement à la (re)construction du cache).
+# Les commandes sont triées par date pour que les filtres de dates ignorent des row groups entiers.
+# since : ne conserver que les commandes passées à partir de cette date (lecture par blocs).
+@instrumented()
+def read_prepared_data(path, since=None):
+    read_options = {'parse_dates': ['date 1ere commande (Restaurant)', 'Date de commande'], 'decimal': '.'}
+    if since is None:
+        df = pd.read_csv(path, **read_options)
+    else:
+        since = pd.Timestamp(since)
+        df = pd.concat(
+            [chunk[chunk['Date de commande'] >= since] for chunk in pd.read_csv(path, chunksize=CSV_CHUNK_SIZE, **read_options)],
+            ignore_index=True
+        )
+    df = df.sort_values('Date de commande', kind='stable').reset_index(drop=True)
     df['Mois'] = df['Date de commande'].dt.strftime('%Y-%m')
+    df = add_order_month_columns(df)
+    df = compact_frame(df, ORDERS_SCHEMA, name='commandes' if since is None else None)
     
-    return historical_data, df
+    return df
 
-@st.cache_data
-def load_recent_purchases():
-    data_dir = 'data'
-    
-    # Vérifier et télécharger les achats récents si nécessaire
-    download_prepared_data()
+# Prédicat pyarrow des exclusions (statuts de commande/paiement et canal trading), évalué à la lecture
+def order_exclusion_filter():
+    canal = pc.field('Canal').cast(pa.string())
+    return (
+        ~pc.field('Statut commande').isin(to_exclude_commande)
+        & ~pc.field('Statut paiement').isin(to_exclude_paiement)
+        & (canal.is_null() | ~pc.match_substring(canal, 'trading', ignore_case=True))
+    )
 
-    df_recent_purchases = pd.read_excel(os.path.join(data_dir, 'dataFR.xlsx'), engine='openpyxl')
+# Charger uniquement les colonnes et les commandes nécessaires à une page
+@instrumented()
+def load_orders(columns=ORDER_COLUMNS, start_date=None, end_date=None, countries=None):
+    filters = order_exclusion_filter()
+    if start_date is not None:
+        filters &= pc.field('Date de commande') >= pd.Timestamp(start_date).to_pydatetime()
+    if end_date is not None:
+        filters &= pc.field('Date de commande') < pd.Timestamp(end_date).to_pydatetime()
+    if countries is not None:
+        filters &= pc.field('Pays').isin(list(countries))
+
+    return read_cached(fetch_source('prepared_data'), read_prepared_data, columns=columns, filters=filters)
+
+# Lire un fichier Excel source (converti une seule fois en Parquet)
+@instrumented()
+def read_excel_source(path):
+    return pd.read_excel(path, engine='openpyxl')
+
+# Lire les achats récents et nettoyer les dates
+@instrumented()
+def read_recent_purchases(path):
+    df_recent_purchases = pd.read_excel(path, engine='openpyxl')
     
     # Supprimer les lignes où la colonne 'Date' contient des valeurs non conformes
-    df_recent_purchases = df_recent_purchases[pd.to_datetime(df_recent_purchases['Date'], errors='coerce').notnull()]
+    df_recent_purchases = df_recent_purchases[pd.to_datetime(df_recent_purchases['Date'], errors='coerce').notnull()].reset_index(drop=True)
 
     if not pd.api.types.is_datetime64_any_dtype(df_recent_purchases['Date']):
         df_recent_purchases['Date'] = pd.to_datetime(df_recent_purchases['Date'], format='%Y-%m-%d', errors='coerce')
+    df_recent_purchases = add_purchase_month_column(df_recent_purchases)
+
+    # Trier par client puis par date : les lignes d'un client sont contiguës (voir src.purchase_index)
+    df_recent_purchases = df_recent_purchases.sort_values(['Restaurant_id', 'Date'], kind='stable').reset_index(drop=True)
+    df_recent_purchases = compact_frame(df_recent_purchases, PURCHASES_SCHEMA, name='achats récents')
     
     return df_recent_purchases
 
-@st.cache_data
+# Fichiers sources des jeux de données (leur signature définit la version des données chargées)
+SOURCE_FILES = [path for path, url in SOURCES.values()]
+
+@instrumented()
+def load_recent_purchases():
+    # Télécharger les achats récents si nécessaire
+    return read_cached(fetch_source('recent_purchases'), read_recent_purchases)
+
+@instrumented()
 def load_objectifs():
-    data_dir = 'data'
-    
-    # Vérifier et télécharger les objectifs si nécessaire
-    download_prepared_data()
-    
-    objectifs_df = pd.read_excel(os.path.join(data_dir, 'objectifs.xlsx'), engine='openpyxl')
-    return objectifs_df
+    # Télécharger les objectifs si nécessaire
+    return read_cached(fetch_source('objectifs'), read_excel_source)
 
-@st.cache_data
+@instrumented()
 def load_segmentation_data():
-    data_dir = 'data'
-    
-    # Vérifier et télécharger les données de segmentation si nécessaire
-    download_prepared_data()
-    
-    segmentation_df = pd.read_excel(os.path.join(data_dir, 'segmentation_data.xlsx'), engine='openpyxl')
-    return segmentation_df
+    # Télécharger les données de segmentation si nécessaire
+    return read_cached(fetch_source('segmentation'), read_excel_source)
 
 def reassign_account_manager(df):
     df = df.sort_values(by=['Restaurant ID', 'Date de commande'])
     # Appliquer forward-fill et backward-fill
     df['Owner email'] = df.groupby('Restaurant ID')['Owner email'].transform(lambda x: x.ffill().bfill())
     # Remplacer les valeurs manquantes par "BLOCKED C1"
-    df['Owner email'].fillna('BLOCKED C1', inplace=True)
+    df['Owner email'] = df['Owner email'].astype(object).fillna('BLOCKED C1')
     return df
 
 def filter_data_by_account(df, account_manager):
-    # Assurez-vous que "BLOCKED C1" est utilisé pour les valeurs manquantes
-    df['Owner email'].fillna('BLOCKED C1', inplace=True)
-    return df[df['Owner email'] == account_manager]
-
-# Charger les données
-historical_data, df = load_data()
-df_recent_purchases = load_recent_purchases()
-objectifs_df = load_objectifs()
-segmentation_df = load_segmentation_data()
+    # "BLOCKED C1" regroupe les valeurs manquantes (sans modifier df, dont la colonne peut être catégorielle)
+    mask = df['Owner email'] == account_manager
+    if account_manager == 'BLOCKED C1':
+        mask |= df['Owner email'].isna()
+    return df[mask]
@@ -0,0 +1,228 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+import streamlit as st
+from src.cohort_cube import build_cohort_cube
+from src.columnar_cache import cached_compaction_report, concat_frames
+from src.months import MISSING_MONTH
+from src.restaurants import RestaurantTable
+from src.retention_history import RetentionHistory
+from src.data_processing import SOURCE_FILES, fetch_all_sources, load_orders, load_recent_purchases, load_segmentation_data, load_objectifs, filter_data_by_account
+
+# Les DataFrames du store sont partagés entre toutes les sessions : avec le copy-on-write,
+# un filtre ou une sélection modifiée par une page ne peut pas altérer les données partagées.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+
+# Version des données : signature (chemin, mtime, taille) des fichiers sources, courte et peu coûteuse à hacher
+def dataset_version(paths=SOURCE_FILES):
+    sha = hashlib.sha1()
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            sha.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size};'.encode())
+    return sha.hexdigest()[:16]
+
+
+# Jeu de données du store chargé au premier accès puis conservé : une page ne charge que ce qu'elle
+# utilise, et un seul chargement a lieu même si plusieurs sessions le demandent en même temps.
+# Chaque jeu de données a son propre verrou : un long chargement (similarity) ne bloque pas celui
+# d'un autre jeu de données. Un chargement qui en demande un autre (cohort_cube -> orders) prend les
+# verrous dans l'ordre des dépendances, toujours le même, sans cycle : pas d'interblocage.
+class dataset:
+    def __init__(self, load):
+        self.load = load
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, store, owner=None):
+        if store is None:
+            return self
+        with store.lock:
+            lock = store.dataset_locks.setdefault(self.name, threading.RLock())
+        with lock:
+            if self.name not in store.__dict__:
+                start = time.perf_counter()
+                value = self.load(store)
+                store.load_times[self.name] = time.perf_counter() - start
+                # Les accès suivants lisent directement l'attribut de l'instance
+                store.__dict__[self.name] = value
+        return store.__dict__[self.name]
+
+
+# Jeu de données partagé par toutes les sessions du processus (lecture seule)
+class DatasetStore:
+    def __init__(self):
+        # Verrou court de la table des verrous par jeu de données
+        self.lock = threading.Lock()
+        self.dataset_locks = {}
+        # Durée de chargement de chaque jeu de données (secondes, dépendances incluses)
+        self.load_times = {}
+
+        # Clé des agrégats en cache : change dès qu'un fichier source est modifié. Les sources sont
+        # téléchargées d'abord (sans effet si elles sont déjà là) : la version identifie toujours les
+        # fichiers effectivement chargés, jamais l'absence de fichiers d'un démarrage à froid.
+        fetch_all_sources()
+        self.version = dataset_version()
+
+    # Résultats de rétention des mois clos (fichiers ajoutés au fil des mois, partagés entre instantanés)
+    @dataset
+    def retention_history(self):
+        return RetentionHistory()
+
+    @dataset
+    def orders(self):
+        return load_orders()
+
+    @dataset
+    def cohort_cube(self):
+        return build_cohort_cube(self.orders)
+
+    # Achats récents triés par (Restaurant_id, Date), avec accès direct aux lignes d'un client.
+    # Les modules des achats et des recommandations (scipy, scikit-learn) sont importés au premier
+    # chargement, pour que les pages qui ne les utilisent pas ne paient pas leur import.
+    @dataset
+    def purchases(self):
+        from src.purchase_index import PurchaseIndex
+        return PurchaseIndex(load_recent_purchases())
+
+    @dataset
+    def recent_purchases(self):
+        return self.purchases.purchases
+
+    @dataset
+    def segmentation(self):
+        return load_segmentation_data()
+
+    @dataset
+    def objectifs(self):
+        return load_objectifs()
+
+    # Table des restaurants (dernière commande, dépenses mensuelles...), calculée une seule fois
+    @dataset
+    def restaurants(self):
+        return RestaurantTable(self.orders)
+
+    @dataset
+    def last_order_dates(self):
+        return self.restaurants.table['Dernière commande']
+
+    # Modèle de filtrage collaboratif (vecteurs creux et voisins précalculés)
+    @dataset
+    def similarity(self):
+        from src.similarity import SimilarityModel
+        return SimilarityModel(self.recent_purchases)
+
+    # Produits classés par support pour chaque groupe de pairs (Gamme, Type)
+    @dataset
+    def peer_support(self):
+        from src.peer_groups import PeerGroupSupport
+        return PeerGroupSupport(self.recent_purchases, self.segmentation)
+
+    # Cadence d'achat de tous les clients par produit et par catégorie
+    @dataset
+    def replenishment(self):
+        from src.replenishment import ReplenishmentTable
+        return ReplenishmentTable(self.recent_purchases)
+
+    # Rapport des chargements effectués (ordre de chargement, durée en secondes)
+    def load_report(self):
+        return pd.DataFrame(list(self.load_times.items()), columns=['Jeu de données', 'Durée (s)'])
+
+    # Octets économisés par colonne à la conversion des sources compactées (métadonnées du cache Parquet)
+    def compaction_report(self):
+        rows = [row for path in SOURCE_FILES for row in cached_compaction_report(path)]
+        return pd.DataFrame(rows, columns=['Jeu de données', 'Colonne', 'Avant (octets)', 'Après (octets)', 'Gain (octets)'])
+
+    # Nouvel instantané où les commandes à partir de start (début de mois) sont remplacées par window.
+    # Seuls les mois à partir de start sont recalculés dans le cube de cohortes ; les jeux de données
+    # qui ne dérivent pas des commandes sont repris tels quels de cet instantané.
+    def refreshed(self, window, start):
+        store = DatasetStore()
+        month = start.year * 12 + start.month - 1
+        orders = self.orders
+        kept = orders['Date de commande'].isna() | (orders['Date de commande'] < start)
+        cube = self.cohort_cube
+        kept_cube = (cube['Mois Index'] < month) | (cube['Mois Index'] == MISSING_MONTH)
+        store.__dict__['orders'] = concat_frames([orders[kept], window])
+        store.__dict__['cohort_cube'] = concat_frames([cube[kept_cube], build_cohort_cube(window)])
+
+        derived = {'orders', 'cohort_cube', 'restaurants', 'last_order_dates'}
+        for name, value in list(self.__dict__.items()):
+            if isinstance(getattr(DatasetStore, name, None), dataset) and name not in derived:
+                store.__dict__[name] = value
+                store.load_times[name] = self.load_times.get(name, 0.0)
+        return store
+
+    # Jeux de données chargés dans cet instantané
+    def loaded(self):
+        return [name for name in self.__dict__ if isinstance(getattr(DatasetStore, name, None), dataset)]
+
+    # Sous-ensemble d'un jeu de données du store ('orders' ou 'cohort_cube') défini par des scalaires,
+    # pour que les fonctions en cache soient indexées sur ces scalaires et non sur le DataFrame filtré
+    def scope(self, name, country=None, region=None, manager=None):
+        df = getattr(self, name)
+        if country is not None:
+            df = df[df['Pays'] == country]
+        if region is not None:
+            df = df[df['region'] == region]
+        if manager is not None:
+            df = filter_data_by_account(df, manager)
+        return df
+
+
+# Instantanés du store : les sessions lisent l'instantané courant pendant qu'un rafraîchissement en
+# prépare un nouveau en arrière-plan, publié d'un seul coup une fois complet. Les derniers instantanés
+# restent accessibles par leur version, pour qu'une exécution commencée avant la publication et les
+# fonctions en cache qu'elle appelle (indexées par version) lisent toutes les mêmes données.
+class StoreSnapshots:
+    def __init__(self, store, keep=2):
+        self.lock = threading.Lock()
+        self.keep = keep
+        self.stores = OrderedDict({store.version: store})
+        self.current = store
+        self.refresher = None
+
+    def get(self, version=None):
+        if version is None:
+            return self.current
+        return self.stores.get(version, self.current)
+
+    # Publier un nouvel instantané ; renvoie les versions encore conservées
+    def publish(self, store):
+        with self.lock:
+            self.stores[store.version] = store
+            while len(self.stores) > self.keep:
+                self.stores.popitem(last=False)
+            self.current = store
+            return list(self.stores)
+
+
+# Une seule instance par processus, sans copie par session (contrairement à st.cache_data).
+# Le rafraîchissement en arrière-plan démarre avec elle s'il est configuré (voir src.refresher).
+@st.cache_resource
+def get_snapshots():
+    from src.refresher import start_refresher
+    snapshots = StoreSnapshots(DatasetStore())
+    snapshots.refresher = start_refresher(snapshots)
+    return snapshots
+
+
+# Store courant, ou celui d'une version donnée (fonctions en cache indexées par version)
+def get_dataset_store(version=None):
+    return get_snapshots().get(version)
+
+
+# Mesure du démarrage à froid (python -m src.dataset_store) : chargement de tous les jeux de données
+if __name__ == "__main__":
+    start = time.perf_counter()
+    store = DatasetStore()
+    for name in ['retention_history', 'cohort_cube', 'last_order_dates', 'recent_purchases', 'segmentation', 'objectifs', 'similarity', 'peer_support', 'replenishment']:
+        getattr(store, name)
+    print(store.load_report().to_string(index=False))
+    print(f"Total : {time.perf_counter() - start:.2f} s")
@@ -1,5 +1,10 @@
-import requests
+import atexit
+import base64
+import json
 import os
+import threading
+import time
+import requests
 from dotenv import load_dotenv
 
 # Charger les variables d'environnement depuis le fichier .env
@@ -7,60 +12,307 @@ load_dotenv()
 
 
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
-REPO_OWNER = 'votre_nom_utilisateur'  # Remplacez par votre nom d'utilisateur GitHub
-REPO_NAME = 'votre_nom_depot'  # Remplacez par le nom de votre dépôt
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')  # Remplaçable par un serveur local (tests)
+REPO_OWNER = os.getenv('GITHUB_REPO_OWNER', 'votre_nom_utilisateur')  # Remplacez par votre nom d'utilisateur GitHub
+REPO_NAME = os.getenv('GITHUB_REPO_NAME', 'votre_nom_depot')  # Remplacez par le nom de votre dépôt
 BRANCH_NAME = 'main'  # Branche sur laquelle vous souhaitez travailler
 FILE_PATH = 'data/objectifs.json'  # Chemin du fichier dans le dépôt
 
-def get_file_sha(file_path):
-    url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/contents/{file_path}"
-    headers = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()['sha']
+# Copie locale du fichier (contenu, sha, ETag) : un nouveau processus n'attend pas GitHub pour l'afficher
+LOCAL_CACHE_PATH = os.path.join('data', 'cache', 'github_objectifs.json')
+
+# Délai de regroupement des enregistrements successifs en un seul commit (secondes)
+WRITE_DELAY = 2.0
+
+# Durée pendant laquelle le contenu en cache est servi sans revalidation (secondes)
+REVALIDATE_AFTER = 60
+
+# Nouvelles tentatives d'un enregistrement après un conflit de sha ou une erreur réseau
+MAX_RETRIES = 3
+
+
+class GitHubConflict(Exception):
+    pass
+
+
+# Client de l'API contents de GitHub pour un fichier JSON :
+# - lecture servie depuis le cache (mémoire, puis copie locale), revalidée en arrière-plan par
+#   requête conditionnelle (If-None-Match : une réponse 304 ne retransfère pas le fichier) ;
+# - écriture différée : les enregistrements rapprochés sont regroupés en un seul commit, envoyé
+#   par un thread avec le sha connu (sans GET préalable) ; en cas de conflit de sha, le fichier
+#   distant est relu et les clés modifiées localement y sont réappliquées.
+class GitHubContentsClient:
+    def __init__(self, owner=REPO_OWNER, repo=REPO_NAME, path=FILE_PATH, branch=BRANCH_NAME, token=GITHUB_TOKEN,
+                 api_url=GITHUB_API_URL, local_cache_path=LOCAL_CACHE_PATH, write_delay=WRITE_DELAY):
+        self.url = f"{api_url.rstrip('/')}/repos/{owner}/{repo}/contents/{path}"
+        self.branch = branch
+        self.path = path
+        self.local_cache_path = local_cache_path
+        self.write_delay = write_delay
+        self.session = requests.Session()
+        self.session.headers['Accept'] = 'application/vnd.github.v3+json'
+        if token:
+            self.session.headers['Authorization'] = f'token {token}'
+
+        self.lock = threading.RLock()
+        self.content = None
+        self.base = None  # Contenu au dernier état connu de GitHub (référence des modifications locales)
+        self.sha = None
+        self.etag = None
+        self.checked_at = 0.0
+        self.pending = False
+        self.last_error = None
+        self.commits = 0
+        self.wake = threading.Event()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.revalidating = False
+        self.writer = threading.Thread(target=self._write_loop, name='github-write-behind', daemon=True)
+        self.writer.start()
+        atexit.register(self.flush)
+        self._read_local_cache()
+
+    def _params(self):
+        return {'ref': self.branch}
+
+    def _read_local_cache(self):
+        if self.local_cache_path and os.path.exists(self.local_cache_path):
+            with open(self.local_cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get('url') == self.url:
+                self.content = self.base = cached['content']
+                self.sha, self.etag = cached['sha'], cached['etag']
+
+    def _write_local_cache(self):
+        if not self.local_cache_path:
+            return
+        os.makedirs(os.path.dirname(self.local_cache_path), exist_ok=True)
+        tmp_path = self.local_cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'url': self.url, 'content': self.base, 'sha': self.sha, 'etag': self.etag}, f)
+        os.replace(tmp_path, self.local_cache_path)
+
+    # Requête conditionnelle : met à jour le contenu s'il a changé sur GitHub (200), rien sinon (304)
+    def revalidate(self):
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        response = self.session.get(self.url, params=self._params(), headers=headers, timeout=10)
+        with self.lock:
+            self.checked_at = time.monotonic()
+            if response.status_code == 304:
+                return False
+            if response.status_code == 404:
+                remote, self.sha, self.etag = {}, None, None
+            else:
+                response.raise_for_status()
+                payload = response.json()
+                remote = json.loads(base64.b64decode(payload['content']).decode('utf-8'))
+                self.sha, self.etag = payload['sha'], response.headers.get('ETag')
+            self.base = remote
+            # Les modifications locales pas encore envoyées restent visibles
+            if not self.pending:
+                self.content = remote
+            self._write_local_cache()
+            return True
+
+    def _revalidate_in_background(self):
+        with self.lock:
+            if self.revalidating:
+                return
+            self.revalidating = True
+
+        def run():
+            try:
+                self.revalidate()
+            except Exception as e:
+                self.last_error = f'{type(e).__name__}: {e}'
+            finally:
+                self.revalidating = False
+
+        threading.Thread(target=run, name='github-revalidate', daemon=True).start()
+
+    # Contenu du fichier : en cache immédiatement (revalidé en arrière-plan s'il est ancien) ;
+    # seule la toute première lecture, sans copie locale, attend GitHub
+    def load(self):
+        with self.lock:
+            content = self.content
+            stale = time.monotonic() - self.checked_at > REVALIDATE_AFTER
+        if content is None:
+            self.revalidate()
+            return self.content
+        if stale:
+            self._revalidate_in_background()
+        return content
+
+    # Enregistrer le contenu : visible tout de suite par load(), envoyé à GitHub par le thread d'écriture
+    def save(self, content):
+        with self.lock:
+            self.content = content
+            self.pending = True
+            self.idle.clear()
+        self.wake.set()
+
+    # Attendre l'envoi des enregistrements en attente
+    def flush(self, timeout=30):
+        if self.pending:
+            self.idle.clear()
+            self.wake.set()
+        return self.idle.wait(timeout)
+
+    def _write_loop(self):
+        while True:
+            self.wake.wait()
+            # Laisser les enregistrements rapprochés s'accumuler
+            time.sleep(self.write_delay)
+            self.wake.clear()
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    self._push()
+                    self.last_error = None
+                    break
+                except Exception as e:
+                    self.last_error = f'{type(e).__name__}: {e}'
+                    try:
+                        if isinstance(e, GitHubConflict):
+                            self._rebase()
+                        else:
+                            time.sleep(min(2 ** attempt, 30))
+                    except Exception as rebase_error:
+                        self.last_error = f'{type(rebase_error).__name__}: {rebase_error}'
+            else:
+                # Le contenu reste en attente : il sera renvoyé au prochain enregistrement
+                print(f"Enregistrement GitHub abandonné après {MAX_RETRIES + 1} tentatives : {self.last_error}")
+                self.idle.set()
+            with self.lock:
+                if not self.pending:
+                    self.idle.set()
+
+    def _push(self):
+        with self.lock:
+            if not self.pending:
+                return
+            content, sha = self.content, self.sha
+        data = {
+            "message": "Mettre à jour les objectifs",
+            "content": base64.b64encode(json.dumps(content, ensure_ascii=False, indent=2).encode('utf-8')).decode('utf-8'),
+            "branch": self.branch,
+        }
+        if sha:
+            data["sha"] = sha
+        response = self.session.put(self.url, json=data, timeout=30)
+        if response.status_code in (409, 422):
+            raise GitHubConflict(response.text)
+        response.raise_for_status()
+        with self.lock:
+            self.sha = response.json()['content']['sha']
+            self.etag = None  # La réponse du PUT ne fournit pas l'ETag du GET : revalidation complète la prochaine fois
+            self.base = content
+            self.commits += 1
+            # Un enregistrement arrivé pendant l'envoi reste en attente
+            self.pending = self.content is not content
+            self._write_local_cache()
+        print(f"Objectifs sauvegardés dans le dépôt GitHub : {self.path}")
+
+    # Conflit : relire le fichier distant et y réappliquer les clés modifiées localement depuis la base
+    def _rebase(self):
+        with self.lock:
+            base, local = self.base or {}, self.content or {}
+        changed = {key: value for key, value in local.items() if base.get(key) != value}
+        removed = [key for key in base if key not in local]
+        self.etag = None
+        self.revalidate()
+        with self.lock:
+            merged = {key: value for key, value in (self.base or {}).items() if key not in removed}
+            merged.update(changed)
+            if self.content is local:
+                self.content = merged
+
+    def status(self):
+        return {'sha': self.sha, 'pending': self.pending, 'commits': self.commits, 'error': self.last_error}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+# Client partagé du processus (fichier des objectifs)
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GitHubContentsClient()
+        return _client
+
+def is_configured():
+    return bool(GITHUB_TOKEN) or GITHUB_API_URL != 'https://api.github.com'
 
 def load_objectifs():
-    url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/contents/{FILE_PATH}"
-    headers = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        content = response.json()
-        import base64
-        import json
-        file_content = base64.b64decode(content['content']).decode('utf-8')
-        return json.loads(file_content)
-    return {}
+    return get_client().load()
 
 def save_objectifs(objectifs):
-    import json
-    url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/contents/{FILE_PATH}"
-    headers = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    sha = get_file_sha(FILE_PATH) if os.path.exists(FILE_PATH) else None
-    data = {
-        "message": "Mettre à jour les objectifs",
-        "content": base64.b64encode(json.dumps(objectifs).encode('utf-8')).decode('utf-8'),
-        "branch": BRANCH_NAME,
-        "sha": sha
-    }
-    response = requests.put(url, headers=headers, json=data)
-    response.raise_for_status()
-    print(f"Objectifs sauvegardés dans le dépôt GitHub : {REPO_NAME}")
+    get_client().save(objectifs)
 
 def test_write_access():
     try:
         load_objectifs()
         print("Test d'accès en lecture réussi")
         save_objectifs({"test": "test"})
-        print("Test d'accès en écriture réussi")
+        get_client().flush()
+        print("Test d'accès en écriture réussi" if get_client().last_error is None else f"Erreur lors du test d'accès : {get_client().last_error}")
     except Exception as e:
         print(f"Erreur lors du test d'accès : {e}")
 
+
+# Serveur local imitant l'API contents de GitHub (GET conditionnel, PUT avec contrôle du sha), pour
+# essayer le client sans réseau : GITHUB_API_URL=http://localhost:<port>
+def serve_local_contents_api(port=0):
+    import hashlib
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse
+
+    files = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload=None, headers=None):
+            body = json.dumps(payload).encode() if payload is not None else b''
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            with lock:
+                stored = files.get(path)
+                server.requests.append(('GET', path))
+            if stored is None:
+                self._send(404, {'message': 'Not Found'})
+            elif self.headers.get('If-None-Match') == f'"{stored["sha"]}"':
+                self._send(304, headers={'ETag': f'"{stored["sha"]}"'})
+            else:
+                self._send(200, {'sha': stored['sha'], 'content': stored['content']}, {'ETag': f'"{stored["sha"]}"'})
+
+        def do_PUT(self):
+            path = urlparse(self.path).path
+            data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            with lock:
+                server.requests.append(('PUT', path))
+                stored = files.get(path)
+                if stored is not None and data.get('sha') != stored['sha']:
+                    self._send(409 if data.get('sha') else 422, {'message': 'sha does not match'})
+                    return
+                sha = hashlib.sha1(base64.b64decode(data['content'])).hexdigest()
+                files[path] = {'sha': sha, 'content': data['content']}
+                server.commits.append(path)
+            self._send(201 if stored is None else 200, {'content': {'path': path, 'sha': sha}})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.files, server.requests, server.commits = files, [], []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, name='github-contents-stub', daemon=True).start()
+    return server
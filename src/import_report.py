@@ -0,0 +1,56 @@
+import re
+import subprocess
+import sys
+import pandas as pd
+
+# Modules importés au démarrage par app.py, puis module de chaque page du menu (voir PAGES dans app.py).
+# app.py lui-même n'est pas mesuré : l'importer exécuterait le script Streamlit.
+STARTUP_MODULES = ['streamlit_option_menu', 'src.dataset_store']
+PAGE_MODULES = ['global_analysis', 'account_analysis', 'objectifs', 'active_users', 'segmentation', 'client_info']
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+# Temps d'import de chaque module (python -X importtime, dans un processus neuf pour mesurer un démarrage à froid)
+def import_times(module):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append({
+                'Module': name,
+                'Niveau': (len(indent) - 1) // 2,
+                'Propre (ms)': int(self_us) / 1000,
+                'Cumulé (ms)': int(cumulative_us) / 1000,
+            })
+    return pd.DataFrame(rows, columns=['Module', 'Niveau', 'Propre (ms)', 'Cumulé (ms)'])
+
+
+# Coût d'import de chaque page et de ses paquets les plus lourds
+def import_report(modules=STARTUP_MODULES + PAGE_MODULES, top=5):
+    report = []
+    for module in modules:
+        times = import_times(module)
+        page = times[times['Module'] == module]
+        # Paquets importés par la page (hors modules du démarrage de Python, de niveau 0)
+        packages = times[(times['Niveau'] > 0) & ~times['Module'].str.contains('.', regex=False)]
+        packages = packages.sort_values('Cumulé (ms)', ascending=False)
+        report.append({
+            'Module': module,
+            'Import (ms)': round(page['Cumulé (ms)'].sum(), 1),
+            'Paquets les plus lourds': ', '.join(
+                f"{name} ({ms:.0f} ms)" for name, ms in packages[['Module', 'Cumulé (ms)']].head(top).itertuples(index=False)
+            ),
+        })
+    return pd.DataFrame(report)
+
+
+# Banc d'essai du démarrage à froid, depuis la racine du dépôt : python -m src.import_report
+if __name__ == "__main__":
+    pd.set_option('display.max_colwidth', None)
+    print(import_report().to_string(index=False))
@@ -0,0 +1,279 @@
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import random
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+import pandas as pd
+
+# Part des appels mesurés (0 : instrumentation désactivée, 1 : tous). Une page mesurée l'est en entier :
+# les fonctions appelées pendant une mesure sont toujours mesurées.
+sample_rate = float(os.environ.get('METRICS_SAMPLE_RATE', 0))
+
+# Pic de mémoire par mesure (tracemalloc ralentit les allocations : désactivé par défaut)
+TRACE_MEMORY = os.environ.get('METRICS_MEMORY') == '1'
+
+# Mesures détaillées (une ligne JSON par appel, fichiers tournants) et export au format texte Prometheus
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join('data', 'metrics'))
+MAX_FILE_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 3
+
+# Intervalle minimal entre deux écritures du fichier Prometheus (secondes)
+EXPORT_INTERVAL = 10
+
+# Bornes des histogrammes de durée (secondes)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_local = threading.local()
+_lock = threading.Lock()
+_totals = {}
+_logger = None
+_last_export = 0.0
+
+
+def set_sample_rate(rate):
+    global sample_rate
+    sample_rate = float(rate)
+    if TRACE_MEMORY and sample_rate > 0 and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+# Nombre de lignes d'une valeur (DataFrame, série, ou premier DataFrame d'un tuple), None sinon
+def row_count(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, tuple):
+        for item in value:
+            if isinstance(item, (pd.DataFrame, pd.Series)):
+                return len(item)
+    return None
+
+
+# Mesure d'un bloc : durée, durée propre (hors mesures imbriquées), lignes en entrée et en sortie,
+# résultat du cache des agrégats et pic de mémoire. Sans mesure en cours, le bloc n'est mesuré
+# qu'avec la probabilité sample_rate ; sinon il ne coûte qu'un test.
+class span:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.cache = None
+        self.active = False
+        self.skipped = False
+
+    def __enter__(self):
+        stack = _stack()
+        if not stack:
+            # Les appels imbriqués d'un bloc non retenu ne sont pas tirés au sort à leur tour
+            if sample_rate <= 0 or getattr(_local, 'skipped', 0):
+                return self
+            if random.random() >= sample_rate:
+                _local.skipped = getattr(_local, 'skipped', 0) + 1
+                self.skipped = True
+                return self
+        self.active = True
+        self.children_seconds = 0.0
+        self.peak = 0
+        if tracemalloc.is_tracing():
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.active:
+            if self.skipped:
+                _local.skipped -= 1
+            return False
+        seconds = time.perf_counter() - self.start
+        stack = _stack()
+        stack.pop()
+        peak_mb = None
+        if tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            peak_mb = (self.peak - self.memory_start) / 1e6
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+        if stack:
+            stack[-1].children_seconds += seconds
+        record({
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'name': self.name,
+            'root': stack[0].name if stack else self.name,
+            'ms': seconds * 1000,
+            'self_ms': (seconds - self.children_seconds) * 1000,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'cache': self.cache,
+            'peak_mb': peak_mb,
+            'error': exc_info[0].__name__ if exc_info[0] is not None else None,
+        })
+        return False
+
+
+# Décorateur : mesurer chaque appel d'une fonction (lignes des DataFrames en argument et du résultat)
+def instrumented(name=None):
+    def decorator(func):
+        span_name = name or f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if sample_rate <= 0 and not getattr(_local, 'stack', None):
+                return func(*args, **kwargs)
+            rows_in = [row_count(value) for value in list(args) + list(kwargs.values())]
+            rows_in = [rows for rows in rows_in if rows is not None]
+            with span(span_name, rows_in=sum(rows_in) if rows_in else None) as current:
+                result = func(*args, **kwargs)
+                current.rows_out = row_count(result)
+            return result
+        return wrapper
+    return decorator
+
+
+# Résultat de la recherche dans le cache des agrégats, rattaché à la mesure en cours
+def note_cache(hit):
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        stack[-1].cache = 'hit' if hit else 'miss'
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(os.path.join(METRICS_DIR, 'metrics.jsonl'), maxBytes=MAX_FILE_BYTES, backupCount=BACKUP_COUNT)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger('dashboard.metrics')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+
+# Enregistrer une mesure : ligne du fichier tournant et cumuls exportés au format Prometheus
+def record(entry):
+    global _last_export
+    seconds = entry['ms'] / 1000
+    with _lock:
+        totals = _totals.setdefault(entry['name'], {
+            'count': 0, 'seconds': 0.0, 'self_seconds': 0.0, 'rows_out': 0, 'hits': 0, 'misses': 0, 'errors': 0,
+            'buckets': [0] * len(BUCKETS),
+        })
+        totals['count'] += 1
+        totals['seconds'] += seconds
+        totals['self_seconds'] += entry['self_ms'] / 1000
+        totals['rows_out'] += entry['rows_out'] or 0
+        totals['hits'] += entry['cache'] == 'hit'
+        totals['misses'] += entry['cache'] == 'miss'
+        totals['errors'] += entry['error'] is not None
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                totals['buckets'][i] += 1
+        export = time.monotonic() - _last_export >= EXPORT_INTERVAL
+        if export:
+            _last_export = time.monotonic()
+
+    _get_logger().info(json.dumps(entry, ensure_ascii=False))
+    if export:
+        write_prometheus()
+
+
+def _label(name):
+    return name.replace('\\', '\\\\').replace('"', '\\"')
+
+
+# Cumuls au format texte Prometheus
+def prometheus_text():
+    with _lock:
+        totals = {name: {**values, 'buckets': list(values['buckets'])} for name, values in _totals.items()}
+    lines = [
+        '# HELP dashboard_call_seconds Durée des appels mesurés',
+        '# TYPE dashboard_call_seconds histogram',
+    ]
+    for name, values in sorted(totals.items()):
+        label = f'name="{_label(name)}"'
+        for bound, count in zip(BUCKETS, values['buckets']):
+            lines.append(f'dashboard_call_seconds_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'dashboard_call_seconds_bucket{{{label},le="+Inf"}} {values["count"]}')
+        lines.append(f'dashboard_call_seconds_sum{{{label}}} {values["seconds"]:.6f}')
+        lines.append(f'dashboard_call_seconds_count{{{label}}} {values["count"]}')
+    for metric, key, help_text in [
+        ('dashboard_call_self_seconds_total', 'self_seconds', 'Durée propre des appels (hors appels mesurés imbriqués)'),
+        ('dashboard_rows_out_total', 'rows_out', 'Lignes renvoyées'),
+        ('dashboard_cache_hits_total', 'hits', 'Résultats lus dans le cache des agrégats'),
+        ('dashboard_cache_misses_total', 'misses', 'Résultats calculés (absents du cache des agrégats)'),
+        ('dashboard_errors_total', 'errors', 'Appels terminés par une exception'),
+    ]:
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        lines += [f'{metric}{{name="{_label(name)}"}} {values[key]}' for name, values in sorted(totals.items())]
+    return '\n'.join(lines) + '\n'
+
+
+# Fichier lu par le textfile collector de node_exporter (écriture atomique)
+def write_prometheus(path=None):
+    path = path or os.path.join(METRICS_DIR, 'metrics.prom')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+    return path
+
+
+# Point d'accès /metrics pour Prometheus, dans un thread du processus (METRICS_PORT)
+def serve_prometheus(port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+# Synthèse des cumuls par fonction (durées moyennes en ms, taux de succès du cache)
+def summary():
+    with _lock:
+        rows = [
+            {
+                'Mesure': name,
+                'Appels': values['count'],
+                'Moyenne (ms)': values['seconds'] / values['count'] * 1000,
+                'Durée propre moyenne (ms)': values['self_seconds'] / values['count'] * 1000,
+                'Cache (succès)': values['hits'] / (values['hits'] + values['misses']) if values['hits'] + values['misses'] else None,
+                'Erreurs': values['errors'],
+            }
+            for name, values in _totals.items()
+        ]
+    return pd.DataFrame(rows, columns=['Mesure', 'Appels', 'Moyenne (ms)', 'Durée propre moyenne (ms)', 'Cache (succès)', 'Erreurs']).sort_values('Moyenne (ms)', ascending=False)
+
+
+set_sample_rate(sample_rate)
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+# Index de mois compact : année * 12 + (mois - 1), stocké en int32.
+# Les dates manquantes reçoivent une valeur sentinelle qui ne satisfait aucun
+# prédicat de segment (égalité, appartenance à une plage ou "antérieur à").
+MISSING_MONTH = np.iinfo(np.int32).max
+
+
+def month_index(dates):
+    index = dates.dt.year * 12 + dates.dt.month - 1
+    return index.fillna(MISSING_MONTH).astype('int32')
+
+
+def month_index_from_str(month_str):
+    year, month = map(int, month_str.split('-'))
+    return year * 12 + month - 1
+
+
+def month_str_from_index(index):
+    return f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+
+# Ajouter les colonnes d'index de mois aux commandes (une seule fois au chargement)
+def add_order_month_columns(df):
+    df['Mois Index'] = month_index(df['Date de commande'])
+    df['Mois 1ere commande Index'] = month_index(df['date 1ere commande (Restaurant)'])
+    return df
+
+
+# Ajouter la colonne d'index de mois aux achats récents
+def add_purchase_month_column(df_recent_purchases):
+    df_recent_purchases['Mois Index'] = month_index(pd.to_datetime(df_recent_purchases['Date'], errors='coerce'))
+    return df_recent_purchases
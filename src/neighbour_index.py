@@ -0,0 +1,214 @@
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# En dessous de ce nombre de restaurants, la recherche exacte est utilisée : le calcul des voisins de
+# tous les restaurants (construction du modèle) croît avec le carré du nombre de restaurants et prend
+# quelques secondes à cette taille (voir benchmark)
+EXACT_LIMIT = 20_000
+
+# Nombre de lignes traitées par bloc par la recherche exacte (borne la mémoire à BLOCK_SIZE x N)
+BLOCK_SIZE = 256
+
+
+# Meilleurs k candidats par ligne : similarité décroissante puis position croissante (résultat déterministe).
+# Les lignes ayant moins de k candidats sont complétées par la position -1.
+def top_k(scores, positions, k):
+    order = np.lexsort((positions, -scores))[:k]
+    top_positions = np.full(k, -1, dtype='int32')
+    top_scores = np.full(k, -np.inf, dtype='float32')
+    top_positions[:len(order)] = positions[order]
+    top_scores[:len(order)] = scores[order]
+    return top_positions, top_scores
+
+
+# Meilleurs k candidats de chaque ligne d'un bloc dense de scores, dans le même ordre que top_k
+# (similarité décroissante puis position croissante) sans trier les n colonnes : sélection linéaire
+# des k meilleurs (np.argpartition), puis tri de ces k seulement. Quand des ex aequo à la k-ième
+# valeur dépassent la sélection, les positions les plus petites sont retenues (lignes concernées seules).
+# Les lignes ayant moins de k scores positifs (k-ième valeur nulle, beaucoup d'ex aequo, cas où
+# argpartition est lent) sont traitées directement par ce second chemin.
+def block_top_k(block, k):
+    k = min(k, block.shape[1])
+    if k == 0:
+        return np.zeros((block.shape[0], 0), dtype='int64'), np.zeros((block.shape[0], 0), dtype=block.dtype)
+    positions = np.empty((block.shape[0], k), dtype='int64')
+    kth = np.zeros((block.shape[0], 1), dtype=block.dtype)
+    few_positive = ((block > 0).sum(axis=1) < k) & ((block >= 0).sum(axis=1) >= k)
+    rows = np.flatnonzero(~few_positive)
+    if len(rows):
+        positions[rows] = np.argpartition(-block[rows], k - 1, axis=1)[:, :k]
+        kth[rows] = np.take_along_axis(block[rows], positions[rows], axis=1).min(axis=1, keepdims=True)
+
+    rows = np.flatnonzero(few_positive | ((block >= kth).sum(axis=1) > k))
+    if len(rows):
+        candidates = block[rows] >= kth[rows]
+        tied = block[rows] == kth[rows]
+        keep = k - (candidates & ~tied).sum(axis=1, keepdims=True)
+        selected = candidates & ~(tied & (np.cumsum(tied, axis=1) > keep))
+        positions[rows] = np.nonzero(selected)[1].reshape(len(rows), k)
+
+    found = np.take_along_axis(block, positions, axis=1)
+    order = np.lexsort((positions, -found), axis=1)
+    return np.take_along_axis(positions, order, axis=1), np.take_along_axis(found, order, axis=1)
+
+
+# Recherche exacte (cosinus sur vecteurs normalisés) par blocs de produits creux
+class BruteForceIndex:
+    def __init__(self, vectors):
+        self.vectors = sparse.csr_matrix(vectors)
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    # Ajout incrémental : renvoie les positions attribuées aux nouveaux vecteurs
+    def add(self, vectors):
+        start = len(self)
+        self.vectors = sparse.vstack([self.vectors, sparse.csr_matrix(vectors)], format='csr')
+        return np.arange(start, len(self))
+
+    # k plus proches voisins de chaque requête ; exclude : position à ignorer par requête (le restaurant lui-même)
+    def search(self, queries, k, exclude=None):
+        queries = sparse.csr_matrix(queries)
+        neighbours = np.full((queries.shape[0], k), -1, dtype='int32')
+        scores = np.full((queries.shape[0], k), -np.inf, dtype='float32')
+        transposed = self.vectors.T.tocsc()
+        for start in range(0, queries.shape[0], BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, queries.shape[0])
+            block = (queries[start:stop] @ transposed).toarray()
+            if exclude is not None:
+                rows = np.arange(stop - start)
+                excluded = np.asarray(exclude[start:stop])
+                valid = excluded >= 0
+                block[rows[valid], excluded[valid]] = -np.inf
+            order, found = block_top_k(block, k)
+            found_positions = np.where(np.isfinite(found), order, -1)
+            neighbours[start:stop, :order.shape[1]] = found_positions
+            scores[start:stop, :order.shape[1]] = found
+        return neighbours, scores
+
+
+# Recherche approchée par hachage LSH (projections aléatoires, signe = bit) : chaque table
+# associe une signature de n_bits à la liste des positions. Les candidats des seaux de la
+# requête (et des seaux voisins à un bit près, en multi-probe) sont reclassés exactement.
+class LSHIndex:
+    def __init__(self, vectors, n_tables=16, n_bits=12, multi_probe=True, seed=0):
+        vectors = sparse.csr_matrix(vectors)
+        rng = np.random.default_rng(seed)
+        self.projections = rng.standard_normal((n_tables, vectors.shape[1], n_bits)).astype('float32')
+        self.powers = 1 << np.arange(n_bits, dtype='int64')
+        self.multi_probe = multi_probe
+        self.tables = [{} for _ in range(n_tables)]
+        self.vectors = sparse.csr_matrix((0, vectors.shape[1]), dtype=vectors.dtype)
+        self.add(vectors)
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    # Signatures (une par table) de chaque vecteur
+    def signatures(self, vectors):
+        return np.stack([((vectors @ projection) > 0) @ self.powers for projection in self.projections], axis=1)
+
+    def add(self, vectors):
+        vectors = sparse.csr_matrix(vectors)
+        start = len(self)
+        self.vectors = sparse.vstack([self.vectors, vectors], format='csr')
+        positions = np.arange(start, len(self))
+        for table, codes in zip(self.tables, self.signatures(vectors).T):
+            for position, code in zip(positions, codes):
+                table.setdefault(int(code), []).append(position)
+        return positions
+
+    def candidates(self, codes):
+        found = []
+        for table, code in zip(self.tables, codes):
+            code = int(code)
+            probes = [code]
+            if self.multi_probe:
+                probes += [code ^ int(power) for power in self.powers]
+            for probe in probes:
+                bucket = table.get(probe)
+                if bucket:
+                    found.append(bucket)
+        if not found:
+            return np.zeros(0, dtype='int64')
+        return np.unique(np.concatenate(found))
+
+    def search(self, queries, k, exclude=None):
+        queries = sparse.csr_matrix(queries)
+        neighbours = np.full((queries.shape[0], k), -1, dtype='int32')
+        scores = np.full((queries.shape[0], k), -np.inf, dtype='float32')
+        for row, codes in enumerate(self.signatures(queries)):
+            positions = self.candidates(codes)
+            if exclude is not None:
+                positions = positions[positions != exclude[row]]
+            if len(positions) == 0:
+                continue
+            similarities = (self.vectors[positions] @ queries[row].T).toarray().ravel()
+            neighbours[row], scores[row] = top_k(similarities, positions, k)
+        return neighbours, scores
+
+
+# Index adapté au volume : exact pour les petits jeux de données, LSH au-delà de EXACT_LIMIT
+def build_index(vectors, kind='auto', **options):
+    if kind == 'auto':
+        kind = 'exact' if vectors.shape[0] <= EXACT_LIMIT else 'lsh'
+    if kind == 'exact':
+        return BruteForceIndex(vectors)
+    if kind == 'lsh':
+        return LSHIndex(vectors, **options)
+    raise ValueError(f"Type d'index inconnu : {kind} (attendu : 'auto', 'exact' ou 'lsh')")
+
+
+# Rappel et latence d'index approchés par rapport à la recherche exacte, sur un échantillon de requêtes,
+# et durée du calcul des voisins de tous les vecteurs (ce que fait la construction de SimilarityModel)
+def benchmark(vectors, k=100, n_queries=200, configurations=None, seed=0, full_build=True):
+    vectors = sparse.csr_matrix(vectors)
+    if configurations is None:
+        configurations = [
+            {'n_tables': 8, 'n_bits': 12},
+            {'n_tables': 16, 'n_bits': 12},
+            {'n_tables': 16, 'n_bits': 10},
+            {'n_tables': 32, 'n_bits': 12},
+        ]
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(vectors.shape[0], size=min(n_queries, vectors.shape[0]), replace=False)
+
+    indexes = [('exact', {}, lambda: BruteForceIndex(vectors))]
+    indexes += [('lsh', options, lambda options=options: LSHIndex(vectors, seed=seed, **options)) for options in configurations]
+
+    results = []
+    exact = None
+    for kind, options, build in indexes:
+        start = time.perf_counter()
+        index = build()
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        neighbours, _ = index.search(vectors[sample], k, exclude=sample)
+        query_ms = (time.perf_counter() - start) * 1000 / len(sample)
+        if exact is None:
+            exact = neighbours
+
+        recall = np.mean([
+            len(set(found[found >= 0]) & set(expected[expected >= 0])) / max((expected >= 0).sum(), 1)
+            for found, expected in zip(neighbours, exact)
+        ])
+        row = {'Index': kind, **options, 'Construction (s)': round(build_seconds, 3), 'Requête (ms)': round(query_ms, 3), f'Rappel@{k}': round(recall, 3)}
+        if full_build:
+            start = time.perf_counter()
+            index.search(vectors, k, exclude=np.arange(vectors.shape[0]))
+            row['Voisins de tous (s)'] = round(build_seconds + time.perf_counter() - start, 3)
+        results.append(row)
+    return pd.DataFrame(results)
+
+
+# Banc d'essai sur les achats récents : python -m src.neighbour_index
+if __name__ == "__main__":
+    from src.data_processing import load_recent_purchases
+    from src.similarity import SimilarityModel
+
+    model = SimilarityModel(load_recent_purchases(), index='exact')
+    print(f"{model.vectors.shape[0]} restaurants x {model.vectors.shape[1]} produits")
+    print(benchmark(model.vectors).to_string(index=False))
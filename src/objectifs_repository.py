@@ -0,0 +1,196 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+
+# Base des objectifs (partagée par toutes les sessions du processus)
+DATABASE_PATH = os.path.join('data', 'objectifs.db')
+
+# Nombre de connexions ouvertes une fois et réutilisées
+POOL_SIZE = 4
+
+# Attente maximale d'un verrou d'écriture (millisecondes)
+BUSY_TIMEOUT_MS = 5000
+
+# Objectif courant par (pays, segment, mois) et historique de toutes les valeurs, alimenté par triggers :
+# chaque création ou modification ajoute une ligne versionnée, dans la même transaction que l'écriture.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objectifs (
+    pays TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    mois TEXT NOT NULL,
+    objectif INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at TEXT NOT NULL,
+    author TEXT,
+    PRIMARY KEY (pays, segment, mois)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS objectifs_mois ON objectifs (mois, pays);
+
+CREATE TABLE IF NOT EXISTS objectifs_history (
+    id INTEGER PRIMARY KEY,
+    pays TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    mois TEXT NOT NULL,
+    objectif INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at TEXT NOT NULL,
+    author TEXT
+);
+
+CREATE INDEX IF NOT EXISTS objectifs_history_key ON objectifs_history (pays, segment, mois, version);
+
+CREATE TRIGGER IF NOT EXISTS objectifs_history_insert AFTER INSERT ON objectifs BEGIN
+    INSERT INTO objectifs_history (pays, segment, mois, objectif, version, updated_at, author)
+    VALUES (NEW.pays, NEW.segment, NEW.mois, NEW.objectif, NEW.version, NEW.updated_at, NEW.author);
+END;
+
+CREATE TRIGGER IF NOT EXISTS objectifs_history_update AFTER UPDATE ON objectifs BEGIN
+    INSERT INTO objectifs_history (pays, segment, mois, objectif, version, updated_at, author)
+    VALUES (NEW.pays, NEW.segment, NEW.mois, NEW.objectif, NEW.version, NEW.updated_at, NEW.author);
+END;
+"""
+
+# Une valeur identique ne crée pas de nouvelle version
+UPSERT = """
+INSERT INTO objectifs (pays, segment, mois, objectif, updated_at, author)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (pays, segment, mois) DO UPDATE SET
+    objectif = excluded.objectif,
+    version = objectifs.version + 1,
+    updated_at = excluded.updated_at,
+    author = excluded.author
+WHERE objectifs.objectif != excluded.objectif
+"""
+
+COLUMNS = ['pays', 'segment', 'mois', 'objectif', 'version', 'updated_at', 'author']
+
+
+# Dépôt des objectifs de clients actifs : connexions SQLite en mode WAL (les lectures ne sont pas
+# bloquées par une écriture en cours), écritures par lots dans une seule transaction.
+class ObjectifsRepository:
+    def __init__(self, path=DATABASE_PATH, pool_size=POOL_SIZE):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.pool = queue.LifoQueue()
+        self.connections = []
+        self.lock = threading.Lock()
+        self.pool_size = pool_size
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        return conn
+
+    # Emprunter une connexion du pool (ouverte à la demande, au plus pool_size)
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = len(self.connections) < self.pool_size
+                if create:
+                    conn = self._connect()
+                    self.connections.append(conn)
+            if not create:
+                conn = self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    # Transaction d'écriture : BEGIN IMMEDIATE prend le verrou d'écriture dès le début
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    # Créer ou modifier des objectifs en une seule transaction.
+    # rows : DataFrame ou itérable de dictionnaires (pays, segment, mois, objectif).
+    # Un objectif manquant (cellule vidée) lève ValueError, sans rien écrire.
+    def upsert(self, rows, author=None):
+        if isinstance(rows, pd.DataFrame):
+            rows = rows.to_dict('records')
+        rows = list(rows)
+        missing = [f"{row['pays']} / {row['segment']}" for row in rows if pd.isna(row['objectif'])]
+        if missing:
+            raise ValueError(f"Objectif manquant pour : {', '.join(missing)}")
+        updated_at = datetime.now().isoformat(timespec='seconds')
+        values = [(row['pays'], row['segment'], row['mois'], int(row['objectif']), updated_at, author) for row in rows]
+        with self.transaction() as conn:
+            # Nombre d'objectifs créés ou modifiés (hors lignes d'historique écrites par les triggers)
+            return conn.executemany(UPSERT, values).rowcount
+
+    def _query(self, sql, parameters=()):
+        with self.connection() as conn:
+            cursor = conn.execute(sql, parameters)
+            columns = [description[0] for description in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    # Objectifs courants, filtrés par mois et/ou pays (index objectifs_mois ou clé primaire)
+    def get(self, mois=None, pays=None):
+        conditions, parameters = [], []
+        if mois is not None:
+            conditions.append('mois = ?')
+            parameters.append(mois)
+        if pays is not None:
+            conditions.append('pays = ?')
+            parameters.append(pays)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return self._query(f'SELECT {", ".join(COLUMNS)} FROM objectifs {where} ORDER BY mois, pays, segment', parameters)
+
+    # Versions successives des objectifs d'un mois (et d'un pays, d'un segment)
+    def history(self, mois, pays=None, segment=None):
+        sql = f'SELECT {", ".join(COLUMNS)} FROM objectifs_history WHERE mois = ?'
+        parameters = [mois]
+        if pays is not None:
+            sql += ' AND pays = ?'
+            parameters.append(pays)
+        if segment is not None:
+            sql += ' AND segment = ?'
+            parameters.append(segment)
+        return self._query(sql + ' ORDER BY pays, segment, version', parameters)
+
+    def months(self):
+        return self._query('SELECT DISTINCT mois FROM objectifs ORDER BY mois')['mois'].tolist()
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+            self.pool = queue.LifoQueue()
+
+
+# Objectifs au format du fichier objectifs.xlsx (country, type, Nb clients) pour un mois
+def from_objectifs_file(objectifs_df, mois):
+    return pd.DataFrame({
+        'pays': objectifs_df['country'].astype(str),
+        'segment': objectifs_df['type'].astype(str),
+        'mois': mois,
+        'objectif': objectifs_df['Nb clients'].astype(int),
+    })
+
+
+def to_objectifs_file(objectifs):
+    return pd.DataFrame({
+        'country': objectifs['pays'],
+        'type': objectifs['segment'],
+        'Nb clients': objectifs['objectif'],
+    })
@@ -0,0 +1,35 @@
+import pandas as pd
+
+# Colonnes de la table de support d'un groupe de pairs
+SUPPORT_COLUMNS = ['product_name', 'order_count', 'Product Category', 'Support (%)']
+
+
+# Produits achetés par chaque groupe de pairs (même Gamme, même Type), calculés une seule fois par
+# version des données : pour chaque groupe, les produits classés par support (part des commandes du
+# groupe qui contiennent le produit), avec leur catégorie.
+class PeerGroupSupport:
+    def __init__(self, purchases, segmentation_df):
+        groups = segmentation_df[['Restaurant_id', 'Gamme', 'Type']].drop_duplicates()
+        peer_purchases = purchases[['Restaurant_id', 'order_id', 'product_name', 'Product Category']].merge(groups, on='Restaurant_id')
+
+        # Les restaurants sans Gamme ou sans Type n'appartiennent à aucun groupe
+        order_counts = peer_purchases.groupby(['Gamme', 'Type'], observed=True)['order_id'].nunique()
+        product_counts = peer_purchases.groupby(['Gamme', 'Type', 'product_name'], observed=True)['order_id'].nunique().reset_index(name='order_count')
+        categories = peer_purchases[['Gamme', 'Type', 'product_name', 'Product Category']].drop_duplicates()
+        support = product_counts.merge(categories, on=['Gamme', 'Type', 'product_name'])
+        support['Support (%)'] = support['order_count'] / order_counts.reindex(pd.MultiIndex.from_frame(support[['Gamme', 'Type']])).to_numpy() * 100
+        support = support.sort_values(['Gamme', 'Type', 'Support (%)', 'product_name'], ascending=[True, True, False, True], kind='stable')
+
+        self.tables = {
+            group: table[SUPPORT_COLUMNS].reset_index(drop=True)
+            for group, table in support.groupby(['Gamme', 'Type'], observed=True, sort=False)
+        }
+
+    # Produits les plus achetés par le groupe (gamme, type), hors produits déjà achetés par le client
+    def top_products(self, gamme, type_, exclude=(), n=10):
+        table = self.tables.get((gamme, type_))
+        if table is None:
+            return pd.DataFrame(columns=SUPPORT_COLUMNS)
+        if len(exclude):
+            table = table[~table['product_name'].isin(exclude)]
+        return table.head(n)
@@ -1,9 +1,12 @@
 import plotly.graph_objs as go
 import pandas as pd
 import numpy as np  # Ajout de l'import de numpy
+from src.metrics import instrumented
 
+@instrumented()
 def plot_ratios(segment, all_results, country_code):
-    years = [2022, 2023, 2024]
+    # Une courbe par année présente dans les résultats, valeurs annotées sur la plus récente
+    years = sorted({int(month[:4]) for month in all_results['Mois']})
     months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
     fig = go.Figure()
 
@@ -16,7 +19,7 @@ def plot_ratios(segment, all_results, country_code):
 
         fig.add_trace(go.Scatter(x=months, y=full_ratios, mode='lines+markers', name=f'{year}'))
 
-        if year == 2024:
+        if year == years[-1]:
             for i, txt in enumerate(full_ratios):
                 if not pd.isna(txt):
                     fig.add_annotation(x=months[i], y=full_ratios[i], text=str(txt), showarrow=True, arrowhead=2)
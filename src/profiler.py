@@ -0,0 +1,219 @@
+import cProfile
+import html
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+
+# Captures de profilage : un fichier de métadonnées (.json) et un artefact (.pstats ou .folded/.svg) par rendu
+PROFILES_DIR = os.environ.get('PROFILES_DIR', os.path.join('data', 'profiles'))
+
+# Nombre de captures conservées (les plus anciennes sont supprimées)
+MAX_CAPTURES = 50
+
+# Pages profilées à chaque rendu sans paramètre d'URL (noms séparés par des virgules, ou 'all'),
+# et mode utilisé : 'cprofile' (déterministe) ou 'sample' (échantillonnage de la pile)
+PROFILE_PAGES = os.environ.get('PROFILE_PAGES', '')
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'cprofile')
+MODES = ['cprofile', 'sample']
+
+# Intervalle entre deux échantillons de la pile (secondes)
+SAMPLE_INTERVAL = 0.005
+
+# Une seule capture à la fois dans le processus (cProfile ne s'imbrique pas)
+_capture_lock = threading.Lock()
+
+
+# Mode de profilage demandé pour ce rendu : paramètre d'URL ?profile=1|cprofile|sample, ou page listée
+# dans PROFILE_PAGES ; None sinon
+def requested_mode(page, query_params):
+    value = query_params.get('profile')
+    if value:
+        return value if value in MODES else PROFILE_MODE
+    pages = [name.strip() for name in PROFILE_PAGES.split(',') if name.strip()]
+    if 'all' in pages or page in pages:
+        return PROFILE_MODE
+    return None
+
+
+# Échantillonnage de la pile d'un seul thread (celui du rendu) depuis un thread dédié :
+# les autres sessions ne sont pas instrumentées
+class StackSampler:
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+# Piles repliées (une ligne "f1;f2;f3 nombre" par pile), format des outils flamegraph
+def folded_stacks(stacks):
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+# Flamegraph SVG autonome (sans dépendance) : largeur proportionnelle au nombre d'échantillons
+def flamegraph_svg(stacks, title, width=1200, row_height=17):
+    root = {'count': 0, 'children': {}}
+    for stack, count in stacks.items():
+        root['count'] += count
+        node = root
+        for name in stack.split(';'):
+            node = node['children'].setdefault(name, {'count': 0, 'children': {}})
+            node['count'] += count
+
+    rects = []
+
+    def draw(node, x, depth):
+        for name, child in sorted(node['children'].items()):
+            child_width = child['count'] / max(root['count'], 1) * width
+            if child_width >= 0.5:
+                rects.append((x, depth, child_width, name, child['count']))
+                draw(child, x, depth + 1)
+            x += child_width
+
+    draw(root, 0.0, 0)
+    max_depth = max((depth for _, depth, _, _, _ in rects), default=0) + 1
+    height = (max_depth + 2) * row_height
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+        f'<text x="4" y="{row_height - 4}">{html.escape(title)} ({root["count"]} échantillons)</text>',
+    ]
+    for x, depth, rect_width, name, count in rects:
+        y = height - (depth + 1) * row_height
+        hue = 20 + (hash(name) % 40)
+        label = name if len(name) * 6.5 < rect_width else name[:max(int(rect_width / 6.5) - 2, 0)] + '..' if rect_width > 20 else ''
+        parts.append(
+            f'<g><title>{html.escape(name)} : {count} ({count / max(root["count"], 1):.1%})</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{rect_width:.1f}" height="{row_height - 1}" fill="hsl({hue},90%,60%)"/>'
+            f'<text x="{x + 2:.1f}" y="{y + row_height - 5}">{html.escape(label)}</text></g>'
+        )
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def _capture_name(page, mode):
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '-', page).strip('-')
+    return f'{datetime.now():%Y%m%d-%H%M%S-%f}_{slug}_{mode}'
+
+
+def _prune():
+    captures = sorted(name for name in os.listdir(PROFILES_DIR) if name.endswith('.json'))
+    for name in captures[:-MAX_CAPTURES]:
+        prefix = name[:-len('.json')]
+        for artefact in os.listdir(PROFILES_DIR):
+            if artefact.startswith(prefix):
+                os.remove(os.path.join(PROFILES_DIR, artefact))
+
+
+# Profiler le bloc (le rendu d'une page) et enregistrer la capture, étiquetée par la page,
+# les paramètres et la version des données. Sans mode, ou si une autre capture est en cours,
+# le bloc s'exécute normalement. La capture produite (métadonnées) est rangée dans result.
+@contextmanager
+def capture(page, params, version, mode, result=None):
+    if mode is None or not _capture_lock.acquire(blocking=False):
+        yield None
+        return
+    try:
+        if mode == 'sample':
+            profiler = StackSampler(threading.get_ident())
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield mode
+        finally:
+            duration = time.perf_counter() - start
+            if mode == 'sample':
+                profiler.stop()
+            else:
+                profiler.disable()
+            meta = save_capture(profiler, page, params, version, mode, duration)
+            if result is not None:
+                result.update(meta)
+    finally:
+        _capture_lock.release()
+
+
+def save_capture(profiler, page, params, version, mode, duration):
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    name = _capture_name(page, mode)
+    path = os.path.join(PROFILES_DIR, name)
+    if mode == 'sample':
+        with open(path + '.folded', 'w') as f:
+            f.write(folded_stacks(profiler.stacks))
+        with open(path + '.svg', 'w') as f:
+            f.write(flamegraph_svg(profiler.stacks, f'{page} - {datetime.now():%Y-%m-%d %H:%M:%S}'))
+        artefacts = [name + '.folded', name + '.svg']
+    else:
+        profiler.dump_stats(path + '.pstats')
+        artefacts = [name + '.pstats']
+
+    meta = {
+        'name': name,
+        'page': page,
+        'params': {key: str(value) for key, value in params.items()},
+        'version': version,
+        'mode': mode,
+        'duration_s': duration,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'artefacts': artefacts,
+    }
+    with open(path + '.json.tmp', 'w') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(path + '.json.tmp', path + '.json')
+    _prune()
+    return meta
+
+
+# Captures enregistrées, les plus récentes d'abord
+def list_captures():
+    rows = []
+    if os.path.isdir(PROFILES_DIR):
+        for name in sorted(os.listdir(PROFILES_DIR), reverse=True):
+            if name.endswith('.json'):
+                with open(os.path.join(PROFILES_DIR, name)) as f:
+                    rows.append(json.load(f))
+    return rows
+
+
+# Fonctions les plus coûteuses d'une capture cProfile (durée cumulée), en tableau
+def top_functions(capture_meta, n=30, sort='cumulative'):
+    import pstats
+    stats = pstats.Stats(os.path.join(PROFILES_DIR, capture_meta['name'] + '.pstats'))
+    rows = []
+    for (filename, line, function), (calls, primitive_calls, total, cumulative, callers) in stats.stats.items():
+        rows.append({
+            'Fonction': f'{function} ({os.path.basename(filename)}:{line})',
+            'Appels': calls,
+            'Durée propre (s)': total,
+            'Durée cumulée (s)': cumulative,
+        })
+    column = 'Durée cumulée (s)' if sort == 'cumulative' else 'Durée propre (s)'
+    return pd.DataFrame(rows).sort_values(column, ascending=False).head(n).reset_index(drop=True)
@@ -0,0 +1,28 @@
+import numpy as np
+
+# Achats récents triés par (Restaurant_id, Date) : les lignes d'un client sont contiguës et
+# retrouvées par recherche dichotomique, ses mois aussi (sans parcourir toute la table).
+class PurchaseIndex:
+    def __init__(self, purchases):
+        ids = purchases['Restaurant_id'].to_numpy()
+        dates = purchases['Date'].to_numpy()
+        if not (np.all(ids[:-1] <= ids[1:]) and np.all((ids[:-1] < ids[1:]) | (dates[:-1] <= dates[1:]))):
+            purchases = purchases.sort_values(['Restaurant_id', 'Date'], kind='stable').reset_index(drop=True)
+        self.purchases = purchases
+        self.ids = purchases['Restaurant_id'].to_numpy()
+        self.months = purchases['Mois Index'].to_numpy()
+
+    # Bornes [début, fin) des lignes d'un client
+    def bounds(self, client_id):
+        return np.searchsorted(self.ids, client_id, side='left'), np.searchsorted(self.ids, client_id, side='right')
+
+    # Lignes d'un client (tranche contiguë de la table)
+    def client(self, client_id):
+        start, stop = self.bounds(client_id)
+        return self.purchases.iloc[start:stop]
+
+    # Lignes d'un client pour un mois (index de mois entier), dans sa tranche triée par date
+    def client_month(self, client_id, month):
+        start, stop = self.bounds(client_id)
+        months = self.months[start:stop]
+        return self.purchases.iloc[start + np.searchsorted(months, month, side='left'):start + np.searchsorted(months, month, side='right')]
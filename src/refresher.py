@@ -0,0 +1,173 @@
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+from src.aggregate_cache import aggregate_cache
+from src.columnar_cache import append_increment, cached_source_hash, file_hash
+from src.data_processing import SOURCES, load_orders, read_prepared_data
+from src.months import month_index_from_str
+
+# Dossier local surveillé à la place de Google Drive (mêmes noms de fichiers que dans data/)
+SOURCE_DIR = os.environ.get('DATA_SOURCE_DIR')
+
+# Intervalle entre deux vérifications des sources (secondes) ; 0 désactive le rafraîchissement.
+# Sans dossier local, le CSV est retéléchargé depuis Drive à chaque vérification : désactivé par défaut.
+REFRESH_INTERVAL = int(os.environ.get('DATA_REFRESH_INTERVAL', 900 if SOURCE_DIR else 0))
+
+# Les commandes des derniers jours avant le filigrane sont relues (changements de statut tardifs) ;
+# la fenêtre relue commence au début du mois pour que les mois antérieurs restent inchangés
+LOOKBACK_DAYS = 7
+
+
+# Source des fichiers dans un dossier local (dépôt manuel, montage réseau, tests)
+class LocalDirectorySource:
+    def __init__(self, directory):
+        self.directory = directory
+
+    # Chemin du fichier d'une source (None s'il n'est pas encore déposé)
+    def fetch(self, name):
+        path = os.path.join(self.directory, os.path.basename(SOURCES[name][0]))
+        return path if os.path.exists(path) else None
+
+
+# Source Google Drive : le fichier est téléchargé à côté de la copie locale à chaque vérification
+class DriveSource:
+    def fetch(self, name):
+        import gdown
+        path, url = SOURCES[name]
+        download_path = path + '.download'
+        return gdown.download(url, download_path, quiet=True)
+
+
+def default_source():
+    return LocalDirectorySource(SOURCE_DIR) if SOURCE_DIR else DriveSource()
+
+
+# Début de la fenêtre relue : début du mois du filigrane moins LOOKBACK_DAYS
+def window_start(watermark):
+    return (pd.Timestamp(watermark) - pd.Timedelta(days=LOOKBACK_DAYS)).to_period('M').to_timestamp()
+
+
+# Intégrer une nouvelle version du CSV des commandes dans un nouvel instantané du store.
+# Seules les commandes à partir de la fenêtre sont lues ; elles sont ajoutées au cache Parquet
+# comme incrément. Renvoie (nouveau store, rapport), ou (None, rapport) si rien n'a changé.
+def refresh_orders(store, source_path):
+    started = time.perf_counter()
+    path = SOURCES['prepared_data'][0]
+    # Les commandes de l'instantané courant sont chargées (et converties) avant l'ajout de l'incrément
+    orders = store.orders
+    if cached_source_hash(path) == file_hash(source_path):
+        return None, {'Statut': 'inchangé'}
+
+    watermark = orders['Date de commande'].max()
+    start = window_start(watermark)
+    window = read_prepared_data(source_path, since=start)
+
+    # Copie atomique de la nouvelle source puis ajout de la fenêtre au cache Parquet
+    if os.path.abspath(source_path) != os.path.abspath(path):
+        shutil.copyfile(source_path, path + '.tmp')
+        os.replace(path + '.tmp', path)
+    append_increment(path, window, start, 'Date de commande')
+    window = load_orders(start_date=start)
+
+    new_store = store.refreshed(window, start)
+
+    # Mois affectés : ceux de la fenêtre, et ceux qui suivent la 1ère commande d'un restaurant
+    # absent de l'instantané précédent (il modifie les effectifs possibles de ces mois)
+    affected = start.year * 12 + start.month - 1
+    new_restaurants = ~window['Restaurant ID'].isin(orders['Restaurant ID'])
+    if new_restaurants.any():
+        affected = min(affected, int(window.loc[new_restaurants, 'Mois 1ere commande Index'].min()))
+
+    report = {
+        'Statut': 'mis à jour',
+        'Filigrane': watermark,
+        'Début de la fenêtre': start,
+        'Commandes relues': len(window),
+        'Nouveaux restaurants': int(window.loc[new_restaurants, 'Restaurant ID'].nunique()),
+        'Premier mois affecté': affected,
+        'Durée (s)': time.perf_counter() - started,
+    }
+    return new_store, report
+
+
+# Agrégats d'un mois antérieur au premier mois affecté : repris tels quels par la nouvelle version
+def unaffected(affected):
+    def keep(arguments):
+        target_month = arguments.get('target_month')
+        return isinstance(target_month, str) and month_index_from_str(target_month) < affected
+    return keep
+
+
+# Vérification périodique des sources dans un thread : le nouvel instantané est préparé entièrement
+# (jeux de données déjà chargés inclus) avant d'être publié, les sessions gardent l'ancien jusque-là
+class Refresher:
+    def __init__(self, snapshots, source=None, interval=REFRESH_INTERVAL):
+        self.snapshots = snapshots
+        self.source = default_source() if source is None else source
+        self.interval = interval
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.last_check = None
+        self.last_report = None
+        self.last_error = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='dataset-refresher', daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if self.stopped.is_set():
+                break
+            try:
+                self.refresh()
+            except Exception as e:
+                self.last_error = f'{type(e).__name__}: {e}'
+
+    # Déclencher une vérification sans attendre l'intervalle
+    def request(self):
+        self.wake.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def refresh(self):
+        self.last_check = datetime.now()
+        source_path = self.source.fetch('prepared_data')
+        if source_path is None:
+            return None
+
+        store = self.snapshots.current
+        new_store, report = refresh_orders(store, source_path)
+        if new_store is not None:
+            for name in store.loaded():
+                getattr(new_store, name)
+            report['Agrégats repris'] = aggregate_cache.carry_over(store.version, new_store.version, unaffected(report['Premier mois affecté']))
+            versions = self.snapshots.publish(new_store)
+            aggregate_cache.retain_version(*versions)
+        self.last_report = report
+        self.last_error = None
+        return report
+
+    def status(self):
+        return {
+            'Dernière vérification': self.last_check,
+            'Version': self.snapshots.current.version,
+            **(self.last_report or {}),
+            'Erreur': self.last_error,
+        }
+
+
+# Démarrer le rafraîchissement en arrière-plan (None s'il est désactivé)
+def start_refresher(snapshots):
+    if REFRESH_INTERVAL <= 0:
+        return None
+    return Refresher(snapshots).start()
@@ -0,0 +1,87 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Un achat est en retard quand le délai depuis le dernier achat dépasse OVERDUE_FACTOR fois
+# l'intervalle médian entre deux achats du client (sa propre cadence)
+OVERDUE_FACTOR = 1.5
+
+# Nombre minimal de jours d'achat pour estimer une cadence
+MIN_PURCHASES = 2
+
+# Seuils fixes (en jours) utilisés tant que la cadence d'un client n'est pas connue
+DEFAULT_THRESHOLDS = {'product_name': 30, 'Product Category': 7, 'Restaurant_id': 15}
+
+
+# Cadence d'achat par (restaurant, clé) pour tous les clients en un seul passage :
+# dernier achat, nombre de jours d'achat et intervalle médian (en jours) entre deux achats
+def purchase_cadence(purchases, key):
+    keys = ['Restaurant_id'] if key == 'Restaurant_id' else ['Restaurant_id', key]
+    days = purchases[keys].assign(Date=purchases['Date'].dt.normalize()).dropna()
+    days = days.drop_duplicates().sort_values(keys + ['Date'], kind='stable')
+
+    # Intervalles entre deux jours d'achat consécutifs d'un même (restaurant, clé)
+    same_group = np.ones(len(days), dtype=bool)
+    for column in keys:
+        values = days[column].to_numpy()
+        same_group[1:] &= values[1:] == values[:-1]
+    same_group[0] = False
+    intervals = days['Date'].diff().dt.days.where(same_group)
+
+    cadence = days.assign(Intervalle=intervals).groupby(keys, observed=True, sort=True).agg(**{
+        'Dernier achat': ('Date', 'max'),
+        "Nombre d'achats": ('Date', 'size'),
+        'Intervalle médian': ('Intervalle', 'median'),
+    })
+    cadence['Seuil (jours)'] = np.where(
+        cadence["Nombre d'achats"] >= MIN_PURCHASES,
+        cadence['Intervalle médian'] * OVERDUE_FACTOR,
+        DEFAULT_THRESHOLDS[key]
+    )
+    return cadence
+
+
+# Marquer les achats en retard à une date de référence (vectoriel, pour un client ou pour tous)
+def flag_overdue(cadence, now=None):
+    now = pd.Timestamp(datetime.now() if now is None else now)
+    days_since = (now - cadence['Dernier achat']).dt.days
+    return cadence.assign(**{
+        'Jours depuis le dernier achat': days_since,
+        'En retard': days_since > cadence['Seuil (jours)'],
+    })
+
+
+# Tables de cadence de tous les clients par produit, par catégorie et tous achats confondus,
+# indexées par Restaurant_id pour une lecture directe des lignes d'un client
+class ReplenishmentTable:
+    def __init__(self, purchases):
+        self.products = purchase_cadence(purchases, 'product_name')
+        self.categories = purchase_cadence(purchases, 'Product Category')
+        self.restaurants = purchase_cadence(purchases, 'Restaurant_id')
+
+    def client_rows(self, table, client_id):
+        try:
+            rows = table.loc[[client_id]]
+        except KeyError:
+            rows = table.iloc[:0]
+        return rows.droplevel('Restaurant_id') if isinstance(rows.index, pd.MultiIndex) else rows
+
+    # Produits en retard pour un client, les plus fréquemment achetés d'abord
+    def overdue_products(self, client_id, now=None):
+        products = flag_overdue(self.client_rows(self.products, client_id), now)
+        products = products[products['En retard']]
+        return products.sort_values("Nombre d'achats", ascending=False, kind='stable')
+
+    # Statut d'une catégorie pour un client (None s'il n'y a jamais acheté)
+    def category_status(self, client_id, category, now=None):
+        categories = self.client_rows(self.categories, client_id)
+        if category not in categories.index:
+            return None
+        return flag_overdue(categories.loc[[category]], now).iloc[0]
+
+    # Statut du client tous achats confondus (None sans achat)
+    def client_status(self, client_id, now=None):
+        rows = self.client_rows(self.restaurants, client_id)
+        if rows.empty:
+            return None
+        return flag_overdue(rows, now).iloc[0]
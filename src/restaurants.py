@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+from src.months import MISSING_MONTH
+
+
+# Table des restaurants (une ligne par Restaurant ID) avec les dépenses mensuelles en matrice dense
+class RestaurantTable:
+    def __init__(self, orders):
+        grouped = orders.groupby('Restaurant ID', sort=True, observed=True)
+        self.table = grouped.agg(**{
+            'Restaurant': ('Restaurant', 'first'),
+            'Pays': ('Pays', 'first'),
+            'region': ('region', 'first'),
+            'Owner email': ('Owner email', 'last'),
+            'Première commande': ('date 1ere commande (Restaurant)', 'first'),
+            'Mois 1ere commande Index': ('Mois 1ere commande Index', 'first'),
+            'Dernière commande': ('Date de commande', 'max'),
+        })
+
+        # Dépenses par restaurant et par mois : spend[position du restaurant, mois - first_month]
+        order_month = orders['Mois Index'].to_numpy()
+        dated = order_month != MISSING_MONTH
+        order_month = order_month[dated]
+        self.first_month = int(order_month.min()) if len(order_month) else 0
+        n_months = int(order_month.max()) - self.first_month + 1 if len(order_month) else 0
+        rows = self.table.index.get_indexer(orders['Restaurant ID'])[dated]
+        self.spend = np.zeros((len(self.table), n_months), dtype='float32')
+        np.add.at(self.spend, (rows, order_month - self.first_month), orders['Total'].to_numpy(dtype='float32', na_value=0)[dated])
+        self.active = np.zeros((len(self.table), n_months), dtype=bool)
+        self.active[rows, order_month - self.first_month] = True
+
+    # Index de mois de chaque colonne de la matrice
+    @property
+    def months(self):
+        return self.first_month + np.arange(self.spend.shape[1])
+
+    def positions(self, restaurant_ids):
+        return self.table.index.get_indexer(restaurant_ids)
+
+    # Dépenses de chaque restaurant sur un mois (index de mois entier), zéro hors de l'historique
+    def monthly_spend(self, month, positions=None):
+        column = month - self.first_month
+        if column < 0 or column >= self.spend.shape[1]:
+            values = np.zeros(len(self.table), dtype='float32')
+        else:
+            values = self.spend[:, column]
+        return values if positions is None else values[positions]
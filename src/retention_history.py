@@ -0,0 +1,188 @@
+import os
+import threading
+import uuid
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from src.months import MISSING_MONTH, month_str_from_index
+from src.refresher import LOOKBACK_DAYS
+
+# Historique de la rétention : un fichier Parquet par mois clos, écrit une seule fois (jamais recalculé)
+HISTORY_DIR = os.path.join('data', 'retention_history')
+
+# Pays proposés dans les pages d'analyse
+COUNTRIES = ['FR', 'US', 'BE', 'GB']
+
+SEGMENTS = ['Acquisition', 'Nouveaux Clients', 'Clients Récents', 'Anciens Clients']
+RESULT_COLUMNS = ['Segment', 'Nombre de Clients', 'Nombre de Clients Possible', 'Nombre de Clients Actifs (Mois Précédent)', 'Rapport (%)', 'Mois']
+
+# Niveaux enregistrés pour chaque mois et colonnes du cube qui les définissent
+LEVELS = {
+    'global': [],
+    'pays': ['Pays'],
+    'region': ['Pays', 'region'],
+    'manager': ['Owner email'],
+}
+SCOPE_COLUMNS = ['Pays', 'region', 'Owner email']
+
+
+# Niveau d'un périmètre (pays, région, account manager) ; None s'il n'est pas enregistré dans l'historique
+def scope_level(country=None, region=None, manager=None):
+    if manager is not None:
+        return 'manager' if country is None and region is None else None
+    if region is not None:
+        return 'region' if country is not None else None
+    return 'pays' if country is not None else 'global'
+
+
+# Dernier mois clos : le rafraîchissement des commandes relit encore le mois précédent pendant
+# LOOKBACK_DAYS jours, et un mois sans commandes plus récentes dans le cube n'est pas encore complet
+def last_closed_month(cube, today=None):
+    day = pd.Timestamp(datetime.today() if today is None else today) - pd.Timedelta(days=LOOKBACK_DAYS)
+    by_date = day.year * 12 + day.month - 2
+    months = cube['Mois Index']
+    data_month = int(months[months != MISSING_MONTH].max()) if len(months) else -1
+    return min(by_date, data_month - 1)
+
+
+# Restaurants du cube avec les colonnes d'un niveau (une colonne constante pour le niveau global,
+# account managers manquants regroupés sous "BLOCKED C1" comme dans filter_data_by_account)
+def _level_frame(cube, keys):
+    frame = pd.DataFrame({
+        'Restaurant ID': cube['Restaurant ID'],
+        'Mois Index': cube['Mois Index'],
+        'Mois 1ere commande Index': cube['Mois 1ere commande Index'],
+    })
+    for key in keys:
+        values = cube[key].astype(object)
+        frame[key] = values.fillna('BLOCKED C1') if key == 'Owner email' else values
+    if not keys:
+        frame['global'] = 'global'
+        keys = ['global']
+    frame = frame.dropna(subset=keys)
+    members = frame[['Restaurant ID', 'Mois 1ere commande Index'] + keys].drop_duplicates()
+    if len(keys) > 1:
+        groups = pd.MultiIndex.from_frame(members[keys].drop_duplicates())
+    else:
+        groups = pd.Index(members[keys[0]].unique(), name=keys[0])
+    return frame, members, keys, groups
+
+
+def _count(frame, mask, keys, groups):
+    counts = frame.loc[mask].groupby(keys, observed=True)['Restaurant ID'].nunique()
+    return counts.reindex(groups, fill_value=0).to_numpy()
+
+
+# Résultats d'un mois pour tous les périmètres d'un niveau en un seul passage par compteur : mêmes
+# définitions que calculations.segments_for_month, appliquées à chaque groupe du niveau
+def segments_by_scope(level_frame, month, level):
+    frame, members, keys, groups = level_frame
+    previous_month = month - 1
+    target = frame[frame['Mois Index'] == month]
+    previous = frame[frame['Mois Index'] == previous_month]
+    first = target['Mois 1ere commande Index']
+    first_previous = previous['Mois 1ere commande Index']
+    first_member = members['Mois 1ere commande Index']
+
+    acquisition = _count(target, first == month, keys, groups)
+    clients = np.vstack([
+        acquisition,
+        _count(target, first == previous_month, keys, groups),
+        _count(target, first.between(month - 5, month - 2), keys, groups),
+        _count(target, first < month - 6, keys, groups),
+    ])
+    possible = np.vstack([
+        acquisition,
+        _count(members, first_member == previous_month, keys, groups),
+        _count(members, first_member.between(month - 5, month - 2), keys, groups),
+        _count(members, first_member < previous_month - 6, keys, groups),
+    ])
+    active_previous = np.vstack([
+        np.zeros(len(groups), dtype=int),
+        _count(previous, first_previous == previous_month, keys, groups),
+        _count(previous, first_previous.between(month - 5, month - 2), keys, groups),
+        _count(previous, first_previous < previous_month - 6, keys, groups),
+    ])
+    ratio = np.round(np.divide(clients, active_previous, out=np.zeros(clients.shape), where=active_previous != 0) * 100, 1)
+
+    # Une ligne par (groupe, segment), dans l'ordre des segments
+    results = pd.DataFrame({
+        'Niveau': level,
+        'Segment': np.tile(SEGMENTS, len(groups)),
+        'Nombre de Clients': clients.T.ravel(),
+        'Nombre de Clients Possible': possible.T.ravel(),
+        'Nombre de Clients Actifs (Mois Précédent)': active_previous.T.ravel(),
+        'Rapport (%)': ratio.T.ravel(),
+        'Mois': month_str_from_index(month),
+    })
+    scope = groups.to_frame(index=False) if len(groups) else pd.DataFrame(columns=keys)
+    for column in SCOPE_COLUMNS:
+        results[column] = np.repeat(scope[column].to_numpy(dtype=object), len(SEGMENTS)) if column in scope.columns else None
+    return results[['Niveau'] + SCOPE_COLUMNS + RESULT_COLUMNS]
+
+
+# Historique des résultats de rétention des mois clos, pour tous les pays, régions et account managers.
+# Chaque mois est ajouté une seule fois dans son propre fichier (écriture atomique) ; les mois déjà
+# enregistrés ne sont jamais recalculés. Plusieurs processus peuvent partager le répertoire.
+class RetentionHistory:
+    def __init__(self, directory=HISTORY_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.frames = {}
+        self.frame = pd.DataFrame(columns=['Niveau'] + SCOPE_COLUMNS + RESULT_COLUMNS)
+
+    def _path(self, month):
+        return os.path.join(self.directory, f'{month_str_from_index(month)}.parquet')
+
+    def _stored_on_disk(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len('.parquet')] for name in os.listdir(self.directory) if name.endswith('.parquet'))
+
+    # Lire les mois ajoutés depuis la dernière lecture (par ce processus ou un autre)
+    def _reload(self):
+        new = [month for month in self._stored_on_disk() if month not in self.frames]
+        for month in new:
+            self.frames[month] = pd.read_parquet(os.path.join(self.directory, f'{month}.parquet'))
+        if new:
+            self.frame = pd.concat([self.frames[month] for month in sorted(self.frames)], ignore_index=True)
+
+    def months(self):
+        with self.lock:
+            self._reload()
+            return sorted(self.frames)
+
+    # Ajouter les mois clos absents de l'historique ; renvoie les mois ajoutés
+    def update(self, cube, today=None):
+        with self.lock:
+            self._reload()
+            months = cube['Mois Index']
+            months = months[months != MISSING_MONTH]
+            if months.empty:
+                return []
+            closed = range(int(months.min()), last_closed_month(cube, today) + 1)
+            missing = [month for month in closed if month_str_from_index(month) not in self.frames]
+            if not missing:
+                return []
+
+            os.makedirs(self.directory, exist_ok=True)
+            level_frames = {level: _level_frame(cube, keys) for level, keys in LEVELS.items()}
+            for month in missing:
+                results = pd.concat([segments_by_scope(level_frame, month, level) for level, level_frame in level_frames.items()], ignore_index=True)
+                tmp_path = f'{self._path(month)}.{uuid.uuid4().hex}.tmp'
+                results.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, self._path(month))
+                self.frames[month_str_from_index(month)] = results
+            self.frame = pd.concat([self.frames[month] for month in sorted(self.frames)], ignore_index=True)
+            return [month_str_from_index(month) for month in missing]
+
+    # Résultats enregistrés d'un périmètre, au format de calculations.segments_for_month
+    def results(self, country=None, region=None, manager=None):
+        level = scope_level(country, region, manager)
+        with self.lock:
+            frame = self.frame
+        mask = frame['Niveau'] == level
+        for column, value in zip(SCOPE_COLUMNS, [country, region, manager]):
+            if value is not None:
+                mask &= frame[column] == value
+        return frame.loc[mask, RESULT_COLUMNS].reset_index(drop=True)
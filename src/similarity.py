@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from src.neighbour_index import build_index
+
+# Nombre de voisins précalculés par restaurant (le filtrage collaboratif en utilise 100)
+N_NEIGHBOURS = 100
+
+# Modèle de similarité restaurant x produit, construit une fois au chargement des achats :
+# matrice creuse (CSR) des GMV aux lignes normalisées et liste des k plus proches voisins par restaurant.
+# index : 'exact', 'lsh' ou 'auto' (choix selon le nombre de restaurants, voir src.neighbour_index).
+class SimilarityModel:
+    def __init__(self, purchases, n_neighbours=N_NEIGHBOURS, index='auto'):
+        restaurants = pd.Categorical(purchases['Restaurant_id'])
+        products = pd.Categorical(purchases['product_name'])
+        self.restaurant_ids = pd.Index(restaurants.categories)
+        self.products = pd.Index(products.categories)
+
+        # Lignes d'achat ignorées si le restaurant ou le produit est manquant
+        known = (restaurants.codes >= 0) & (products.codes >= 0)
+        rows = restaurants.codes[known]
+        cols = products.codes[known]
+        shape = (len(self.restaurant_ids), len(self.products))
+        gmv = purchases['GMV'].to_numpy(dtype='float64', na_value=0)[known]
+
+        # Les doublons (restaurant, produit) sont additionnés à la conversion en CSR
+        self.vectors = normalize(sparse.csr_matrix((gmv, (rows, cols)), shape=shape))
+        self.line_counts = sparse.csr_matrix((np.ones(len(rows), dtype='int32'), (rows, cols)), shape=shape)
+        self.product_gmv = pd.Series(np.bincount(cols, weights=gmv, minlength=shape[1]), index=self.products)
+        self.n_neighbours = n_neighbours
+        self.index = build_index(self.vectors, index)
+        positions = np.arange(len(self.restaurant_ids))
+        self.neighbours, self.scores = self.index.search(self.vectors, n_neighbours, exclude=positions)
+
+    # Ajout incrémental de nouveaux restaurants (produits déjà connus du modèle) : seuls leurs voisins
+    # sont calculés, les listes des restaurants existants restent celles de la construction
+    def add_restaurants(self, purchases):
+        purchases = purchases[~purchases['Restaurant_id'].isin(self.restaurant_ids)]
+        restaurants = pd.Categorical(purchases['Restaurant_id'])
+        cols = self.products.get_indexer(purchases['product_name'])
+        known = (restaurants.codes >= 0) & (cols >= 0)
+        rows = restaurants.codes[known]
+        cols = cols[known]
+        shape = (len(restaurants.categories), len(self.products))
+        gmv = purchases['GMV'].to_numpy(dtype='float64', na_value=0)[known]
+
+        vectors = normalize(sparse.csr_matrix((gmv, (rows, cols)), shape=shape))
+        positions = self.index.add(vectors)
+        self.vectors = self.index.vectors
+        self.line_counts = sparse.vstack([self.line_counts, sparse.csr_matrix((np.ones(len(rows), dtype='int32'), (rows, cols)), shape=shape)], format='csr')
+        self.product_gmv = self.product_gmv + np.bincount(cols, weights=gmv, minlength=shape[1])
+        self.restaurant_ids = self.restaurant_ids.append(pd.Index(restaurants.categories))
+        neighbours, scores = self.index.search(vectors, self.n_neighbours, exclude=positions)
+        self.neighbours = np.vstack([self.neighbours, neighbours])
+        self.scores = np.vstack([self.scores, scores])
+        return positions
+
+    # Voisins connus d'un restaurant (les positions -1 complètent les listes incomplètes)
+    def neighbour_positions(self, position, n):
+        neighbours = self.neighbours[position, :n]
+        return neighbours[neighbours >= 0]
+
+    # Identifiants des restaurants les plus similaires (une seule lecture dans la table des voisins)
+    def similar_restaurants(self, restaurant_id, n=N_NEIGHBOURS):
+        position = self.restaurant_ids.get_indexer([restaurant_id])[0]
+        if position < 0:
+            return self.restaurant_ids[:0]
+        return self.restaurant_ids[self.neighbour_positions(position, n)]
+
+    # Produits les plus achetés (en nombre de lignes) par les voisins, classés par GMV total
+    def recommend_products(self, restaurant_id, n_neighbours=N_NEIGHBOURS, n_products=10):
+        position = self.restaurant_ids.get_indexer([restaurant_id])[0]
+        if position < 0:
+            return pd.DataFrame({'product_name': pd.Series(dtype=object), 'GMV': pd.Series(dtype='float64')})
+        counts = np.asarray(self.line_counts[self.neighbour_positions(position, n_neighbours)].sum(axis=0)).ravel()
+        bought = np.flatnonzero(counts)
+        top = bought[np.lexsort((bought, -counts[bought]))][:n_products]
+        recommendations = self.product_gmv.iloc[top].rename_axis('product_name').reset_index(name='GMV')
+        return recommendations.sort_values(by='GMV', ascending=False)
@@ -0,0 +1,188 @@
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from src.data_processing import SOURCES
+
+# Pays des restaurants (part du parc) et leurs régions
+COUNTRIES = {'FR': 0.6, 'BE': 0.15, 'US': 0.15, 'GB': 0.1}
+REGIONS = {
+    'FR': ['Paris', 'Paris EST', 'Paris Ouest', 'Province'],
+    'BE': ['Bruxelles', 'Wallonie', 'Flandre'],
+    'US': ['NY', 'CA'],
+    'GB': ['London'],
+}
+
+# Statuts et canaux des commandes (les valeurs exclues des analyses restent minoritaires)
+ORDER_STATUSES = {'DONE': 0.93, 'CANCELLED': 0.03, 'ABANDONED': 0.02, 'WAITING': 0.01, 'FAILED': 0.01}
+PAYMENT_STATUSES = {'PAID': 0.97, 'CANCELLED': 0.02, 'ERROR': 0.01}
+CHANNELS = {'Web': 0.7, 'App': 0.27, 'Trading': 0.03}
+
+CATEGORIES = ['Fruits et Légumes', 'Boucherie', 'Crémerie', 'Epicerie Salée', 'Epicerie Sucrée', 'Boissons', 'Marée', 'Surgelés']
+RESTAURANT_TYPES = ['Traditionnel', 'Bistronomie', 'Restauration rapide', 'Gastronomique', 'Brasserie']
+
+# Les achats Excel ne peuvent pas dépasser une feuille
+EXCEL_MAX_ROWS = 1_048_575
+
+# Nombre de groupes de restaurants aux paniers proches (structure retrouvée par le filtrage collaboratif)
+N_CLUSTERS = 20
+
+FIRST_RESTAURANT_ID = 40000
+
+
+def _choice(rng, weights, size):
+    values = list(weights)
+    p = np.array(list(weights.values()), dtype=float)
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=p / p.sum())]
+
+
+# Parc de restaurants : pays, région, account manager, date de 1ère commande, durée de vie et fréquence
+def generate_restaurants(n_restaurants, start, end, n_managers=25, seed=0):
+    rng = np.random.default_rng(seed)
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    span_days = (end - start).days
+
+    countries = _choice(rng, COUNTRIES, n_restaurants)
+    regions = np.array([REGIONS[country][i % len(REGIONS[country])] for i, country in enumerate(countries)], dtype=object)
+    managers = np.array([f'account.manager{i}@exemple.com' for i in range(n_managers)], dtype=object)[rng.integers(0, n_managers, n_restaurants)]
+    managers[rng.random(n_restaurants) < 0.05] = None
+
+    # Acquisitions plus nombreuses sur la fin de période (croissance), durées de vie exponentielles
+    first_orders = start + pd.to_timedelta((span_days * np.sqrt(rng.random(n_restaurants))).astype(int), unit='D')
+    lifetimes = np.minimum(rng.exponential(540, n_restaurants).astype(int) + 1, (end - first_orders).days + 1)
+
+    return pd.DataFrame({
+        'Restaurant ID': FIRST_RESTAURANT_ID + np.arange(n_restaurants),
+        'Restaurant': [f'Restaurant {i}' for i in range(n_restaurants)],
+        'date 1ere commande (Restaurant)': first_orders,
+        'Pays': countries,
+        'region': regions,
+        'Owner email': managers,
+        'Durée de vie (jours)': lifetimes,
+        'Fréquence': rng.lognormal(0, 0.8, n_restaurants),
+        'Cluster': rng.integers(0, N_CLUSTERS, n_restaurants),
+    })
+
+
+# Commandes au format de prepared_data.csv : chaque restaurant commande pendant sa durée de vie,
+# en proportion de sa fréquence, la première commande tombant le jour de sa date de 1ère commande
+def generate_orders(restaurants, n_orders, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    weights = restaurants['Fréquence'].to_numpy() * restaurants['Durée de vie (jours)'].to_numpy()
+    rows = rng.choice(len(restaurants), size=n_orders, p=weights / weights.sum())
+    rows[:min(len(restaurants), n_orders)] = np.arange(min(len(restaurants), n_orders))
+    offsets = (rng.random(n_orders) * restaurants['Durée de vie (jours)'].to_numpy()[rows]).astype(int)
+    offsets[:min(len(restaurants), n_orders)] = 0
+
+    orders = restaurants.iloc[rows][['Restaurant ID', 'Restaurant', 'date 1ere commande (Restaurant)', 'Pays', 'region', 'Owner email']].reset_index(drop=True)
+    orders.insert(2, 'Date de commande', orders['date 1ere commande (Restaurant)'] + pd.to_timedelta(offsets, unit='D'))
+    orders['Total'] = np.round(rng.lognormal(5.6, 0.7, n_orders), 2)
+    orders['Statut commande'] = _choice(rng, ORDER_STATUSES, n_orders)
+    orders['Statut paiement'] = _choice(rng, PAYMENT_STATUSES, n_orders)
+    orders['Canal'] = _choice(rng, CHANNELS, n_orders)
+    return orders.sort_values('Date de commande', kind='stable').reset_index(drop=True)
+
+
+# Catalogue : catégorie, sous-catégorie, fournisseur et prix de chaque produit
+def generate_products(n_products, seed=0):
+    rng = np.random.default_rng(seed + 2)
+    categories = np.array(CATEGORIES, dtype=object)[rng.integers(0, len(CATEGORIES), n_products)]
+    return pd.DataFrame({
+        'product_name': [f'Produit {i}' for i in range(n_products)],
+        'Product Category': categories,
+        'sub_cat': [f'{category} {i % 4}' for i, category in enumerate(categories)],
+        'Supplier': [f'Fournisseur {i}' for i in rng.integers(0, max(n_products // 50, 1), n_products)],
+        'Prix': np.round(rng.lognormal(2.5, 0.8, n_products), 2),
+    })
+
+
+# Achats récents au format de dataFR.xlsx (restaurants français, six derniers mois) : chaque groupe de
+# restaurants a son ordre de préférence des produits, tiré selon une loi de Zipf
+def generate_purchases(restaurants, products, n_rows, end, months=6, lines_per_order=8, seed=0):
+    rng = np.random.default_rng(seed + 3)
+    end = pd.Timestamp(end)
+    start = end - pd.DateOffset(months=months)
+    french = restaurants[(restaurants['Pays'] == 'FR') & (restaurants['date 1ere commande (Restaurant)'] <= end)]
+    active = french['date 1ere commande (Restaurant)'] + pd.to_timedelta(french['Durée de vie (jours)'], unit='D') >= start
+    french = french[active]
+
+    n_orders = max(n_rows // lines_per_order, 1)
+    weights = french['Fréquence'].to_numpy()
+    order_rows = rng.choice(len(french), size=n_orders, p=weights / weights.sum())
+    order_dates = start + pd.to_timedelta(rng.integers(0, (end - start).days + 1, n_orders), unit='D')
+    line_orders = np.sort(rng.integers(0, n_orders, n_rows))
+
+    preferences = np.stack([rng.permutation(len(products)) for _ in range(N_CLUSTERS)])
+    ranks = np.minimum(rng.zipf(1.3, n_rows) - 1, len(products) - 1)
+    clusters = french['Cluster'].to_numpy()[order_rows[line_orders]]
+    product_rows = preferences[clusters, ranks]
+
+    purchases = pd.DataFrame({
+        'Restaurant_id': french['Restaurant ID'].to_numpy()[order_rows[line_orders]],
+        'Date': order_dates[line_orders],
+        'order_id': 1_000_000 + line_orders,
+    })
+    for column in ['product_name', 'Product Category', 'sub_cat', 'Supplier']:
+        purchases[column] = products[column].to_numpy()[product_rows]
+    purchases['GMV'] = np.round(products['Prix'].to_numpy()[product_rows] * rng.integers(1, 10, n_rows), 2)
+    return purchases
+
+
+# Données de segmentation : gamme et type de restaurant (liés au groupe de paniers)
+def generate_segmentation(restaurants, seed=0):
+    rng = np.random.default_rng(seed + 4)
+    types = np.array(RESTAURANT_TYPES, dtype=object)[restaurants['Cluster'].to_numpy() % len(RESTAURANT_TYPES)]
+    return pd.DataFrame({
+        'Restaurant_id': restaurants['Restaurant ID'],
+        'Gamme': rng.integers(1, 4, len(restaurants)),
+        'Type': types,
+        'Type_detail': [f'{restaurant_type} {cluster}' for restaurant_type, cluster in zip(types, restaurants['Cluster'])],
+    })
+
+
+# Objectifs de clients actifs par pays et segment, proportionnels au parc
+def generate_objectifs(restaurants):
+    counts = restaurants['Pays'].value_counts()
+    rows = []
+    for country, count in counts.items():
+        for segment, share in [('Nouveaux Clients', 0.03), ('Clients Récents', 0.08), ('Anciens Clients', 0.3)]:
+            rows.append({'country': country, 'type': segment, 'Nb clients': int(count * share)})
+    return pd.DataFrame(rows)
+
+
+# Écrire un jeu de données complet dans directory/data (mêmes noms de fichiers que les sources réelles).
+# Les fichiers d'historique de rétention du dépôt sont copiés tels quels.
+def write_dataset(directory, n_orders=100_000, n_restaurants=5_000, n_products=1_000, n_purchases=50_000,
+                  start='2022-01-01', end=None, seed=0):
+    if n_purchases > EXCEL_MAX_ROWS:
+        raise ValueError(f"{n_purchases} achats : une feuille Excel est limitée à {EXCEL_MAX_ROWS} lignes")
+    end = pd.Timestamp(datetime.today().date() if end is None else end)
+
+    restaurants = generate_restaurants(n_restaurants, start, end, seed=seed)
+    products = generate_products(n_products, seed=seed)
+    paths = {name: os.path.join(directory, path) for name, (path, url) in SOURCES.items()}
+    os.makedirs(os.path.dirname(paths['prepared_data']), exist_ok=True)
+
+    generate_orders(restaurants, n_orders, seed=seed).to_csv(paths['prepared_data'], index=False)
+    generate_purchases(restaurants, products, n_purchases, end, seed=seed).to_excel(paths['recent_purchases'], index=False)
+    generate_segmentation(restaurants, seed=seed).to_excel(paths['segmentation'], index=False)
+    generate_objectifs(restaurants).to_excel(paths['objectifs'], index=False)
+    return paths
+
+
+# Génération d'un jeu de données : python -m src.synthetic_data /tmp/donnees --orders 1000000
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Générer un jeu de données synthétique (commandes, achats, segmentation, objectifs)')
+    parser.add_argument('directory', help='Répertoire de destination (les fichiers sont écrits dans son sous-répertoire data/)')
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--restaurants', type=int, default=5_000)
+    parser.add_argument('--products', type=int, default=1_000)
+    parser.add_argument('--purchases', type=int, default=50_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = write_dataset(args.directory, args.orders, args.restaurants, args.products, args.purchases, seed=args.seed)
+    for name, path in paths.items():
+        print(f"{name} : {path} ({os.path.getsize(path) / 1e6:.1f} Mo)")
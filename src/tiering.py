@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+from src.months import MISSING_MONTH
+
+# Niveaux de dépense, du plus bas au plus haut, et bornes supérieures (incluses) des niveaux
+SPENDING_LEVELS = ['Basic', 'Silver', 'Gold', 'High Spenders']
+SPENDING_THRESHOLDS = (500, 1500, 2000)
+
+# Segments définis par l'écart en mois entre le mois d'activité et le mois de 1ère commande
+# (borne haute None = sans limite). Un écart de 6 mois ne correspond à aucun segment.
+SEGMENTS = ['Acquisition', 'Nouveaux Clients', 'Clients Récents', 'Anciens Clients']
+SEGMENT_OFFSETS = [(0, 0), (1, 1), (2, 5), (7, None)]
+
+
+# Code de niveau de dépense (0 = Basic ... 3 = High Spenders) pour un tableau de montants
+def tier_codes(amounts, thresholds=SPENDING_THRESHOLDS):
+    return np.searchsorted(np.asarray(thresholds, dtype='float64'), amounts, side='left').astype('int8')
+
+
+# Code de segment (-1 = aucun segment) pour des mois de 1ère commande et des mois d'activité (diffusés)
+def segment_codes(first_month, month):
+    first_month = np.asarray(first_month, dtype='int64')
+    age = np.asarray(month, dtype='int64') - first_month
+    codes = np.full(age.shape, -1, dtype='int8')
+    for code, (low, high) in enumerate(SEGMENT_OFFSETS):
+        in_segment = age >= low if high is None else (age >= low) & (age <= high)
+        codes[in_segment & (first_month != MISSING_MONTH)] = code
+    return codes
+
+
+def spending_levels(amounts, thresholds=SPENDING_THRESHOLDS):
+    return pd.Categorical.from_codes(tier_codes(amounts, thresholds), categories=SPENDING_LEVELS, ordered=True)
+
+
+def segment_labels(first_month, month):
+    return pd.Categorical.from_codes(segment_codes(first_month, month), categories=SEGMENTS)
+
+
+# Niveaux et segments de tous les restaurants pour tous les mois en un seul passage (-1 si inactif)
+def classify_restaurants(restaurants, thresholds=SPENDING_THRESHOLDS):
+    months = restaurants.months
+    first_month = restaurants.table['Mois 1ere commande Index'].to_numpy()
+    tiers = np.where(restaurants.active, tier_codes(restaurants.spend, thresholds), -1).astype('int8')
+    segments = np.where(restaurants.active, segment_codes(first_month[:, None], months[None, :]), -1).astype('int8')
+    return months, tiers, segments
+
+
+# Nombre de clients actifs par mois, segment et niveau de dépense (format long)
+def tier_segment_counts(restaurants, thresholds=SPENDING_THRESHOLDS):
+    months, tiers, segments = classify_restaurants(restaurants, thresholds)
+    n_tiers, n_segments = len(SPENDING_LEVELS), len(SEGMENTS)
+    month_codes = np.broadcast_to(np.arange(len(months)), tiers.shape)
+    classified = (tiers >= 0) & (segments >= 0)
+    keys = (month_codes[classified] * n_segments + segments[classified]) * n_tiers + tiers[classified]
+    counts = np.bincount(keys, minlength=len(months) * n_segments * n_tiers)
+
+    grid = pd.MultiIndex.from_product([months, SEGMENTS, SPENDING_LEVELS], names=['Mois Index', 'Segment', 'Spending Level'])
+    return pd.DataFrame({'Nombre de Clients': counts}, index=grid).reset_index()